@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Main file
+Times hash_passwords and verify_many with 1 to N workers
+Usage: ./10-main.py [passwords, default 32] [max workers, default CPUs]
+"""
+import os
+import sys
+import time
+
+encrypt_password = __import__('encrypt_password')
+hash_passwords = encrypt_password.hash_passwords
+verify_many = encrypt_password.verify_many
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+passwords = ["MyAmazingPassw0rd{}".format(i) for i in range(count)]
+rounds = encrypt_password.bcrypt_rounds()
+print("{} passwords, {} rounds".format(count, rounds))
+
+base = {}
+for workers in range(1, max_workers + 1):
+    start = time.perf_counter()
+    hashed = list(hash_passwords(passwords, workers=workers))
+    hashing = time.perf_counter() - start
+    start = time.perf_counter()
+    checked = list(verify_many(zip(hashed, passwords), workers=workers))
+    verifying = time.perf_counter() - start
+    assert all(checked)
+    base.setdefault("hash", hashing)
+    base.setdefault("verify", verifying)
+    print("{} workers: hash {:.2f} s (speedup {:.2f}), "
+          "verify {:.2f} s (speedup {:.2f})".format(
+              workers, hashing, base["hash"] / hashing,
+              verifying, base["verify"] / verifying))
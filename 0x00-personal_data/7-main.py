@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Main file
+Times filter_datum against the former one-regex-per-field loop with 5,
+50 and 500 fields
+"""
+import re
+import timeit
+
+from filtered_logger import FieldTrie, _redaction_pattern, filter_datum
+
+
+def loop_filter_datum(fields, redaction, message, separator):
+    """ filter_datum as it was: one re.sub per field """
+    for field in fields:
+        message = re.sub(field + '=.*?' + separator,
+                         field + '=' + redaction + separator, message)
+    return message
+
+
+message = ("name=Bob;email=bob@dylan.com;phone=000-123-4567;"
+           "ssn=000-11-2222;password=bobbycool;ip=60ed:c396:2ff:244:bbd0;"
+           "last_login=2019-11-14T06:16:24;user_agent=Mozilla/5.0;")
+for count in (5, 50, 500):
+    fields = ["name", "email", "phone", "ssn", "password"]
+    fields += ["pii_key_{}".format(i) for i in range(count - len(fields))]
+    assert filter_datum(fields, "***", message, ";") == \
+        loop_filter_datum(fields, "***", message, ";")
+    matchers = (
+        ("loop", lambda: loop_filter_datum(fields, "***", message, ";")),
+        ("regex", lambda: _redaction_pattern(tuple(fields), ";").sub(
+            lambda m: m.group(1) + "=***;", message)),
+        ("trie", lambda: trie.sub("***", message)),
+        ("filter_datum", lambda: filter_datum(fields, "***", message, ";")),
+    )
+    trie = FieldTrie(tuple(fields), ";")
+    timings = []
+    for name, func in matchers:
+        seconds = min(timeit.repeat(func, number=200, repeat=3)) / 200
+        timings.append("{} {:.1f} us".format(name, seconds * 1e6))
+    print("{} fields: {}".format(count, ", ".join(timings)))
+
+trie = FieldTrie(tuple("field_{}".format(i) for i in range(500)), ";")
+for lines in (10000, 20000, 40000):
+    text = "\n".join("field_{}=value without separator".format(i % 500)
+                     for i in range(lines))
+    seconds = min(timeit.repeat(lambda: trie.sub("***", text), number=1,
+                                repeat=3))
+    print("{} lines without separator: trie {:.1f} ms".format(
+        lines, seconds * 1e3))
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Main file
+Times scrub() on a generated log file with 1 to N worker processes
+Usage: ./8-main.py [size in MiB, default 64] [max workers, default CPUs]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from filtered_logger import PII_FIELDS
+from scrub_logs import scrub
+
+
+size = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+line = ("name=Bob Dylan;email=bob@dylan.com;phone=000-123-4567;"
+        "ssn=000-11-2222;password=bobbycool;ip=60ed:c396:2ff:244:bbd0;"
+        "last_login=2019-11-14T06:16:24;user_agent=Mozilla/5.0;\n")
+with tempfile.TemporaryDirectory() as tmp:
+    log_path = os.path.join(tmp, "user_data.log")
+    with open(log_path, "w") as f:
+        block = line * 1000
+        for _ in range(size * 1024 * 1024 // len(block) + 1):
+            f.write(block)
+    out_path = os.path.join(tmp, "scrubbed.log")
+    base = None
+    for workers in range(1, max_workers + 1):
+        start = time.perf_counter()
+        with open(out_path, "wb") as out:
+            read = scrub(log_path, out, PII_FIELDS, workers=workers,
+                         chunk_size=4 * 1024 * 1024)
+        seconds = time.perf_counter() - start
+        base = base or seconds
+        print("{} workers: {:.2f} s, {:.0f} MiB/s, speedup {:.2f}".format(
+            workers, seconds, read / seconds / (1024 * 1024),
+            base / seconds))
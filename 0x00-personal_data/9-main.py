@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+Main file
+Times 10k calls to get_logger and checks that the logger keeps a single
+redacting handler
+"""
+import timeit
+
+get_logger = __import__('filtered_logger').get_logger
+
+calls = 10000
+seconds = timeit.timeit(get_logger, number=calls)
+logger = get_logger()
+print("{} calls: {:.1f} ms, {:.2f} us per call".format(
+    calls, seconds * 1e3, seconds / calls * 1e6))
+print("handlers: {}".format(len(logger.handlers)))
+try:
+    get_logger(queued=True)
+except ValueError as e:
+    print(e)
@@ -2,30 +2,152 @@
 """
 Defines a hash_password and is_valid functions
 """
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, Iterator, Tuple
+
 import bcrypt
 from bcrypt import hashpw
 
 
-def hash_password(password: str) -> bytes:
+BCRYPT_ROUNDS = 12
+
+
+def bcrypt_rounds() -> int:
+    """
+    Returns the configured bcrypt cost factor
+    It is read from PERSONAL_DATA_BCRYPT_ROUNDS and kept within the
+    4 to 31 range accepted by bcrypt
+    Return:
+        int
+    """
+    try:
+        rounds = int(os.getenv('PERSONAL_DATA_BCRYPT_ROUNDS'))
+    except (TypeError, ValueError):
+        return BCRYPT_ROUNDS
+    return min(max(rounds, 4), 31)
+
+
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     Returns a hashed password
     Args:
         password: password to be hashed
+        rounds: bcrypt cost factor, defaults to bcrypt_rounds()
     Return:
         bytes
     """
     enc_pwd = password.encode()
-    hash_pwd = hashpw(enc_pwd, bcrypt.gensalt())
+    hash_pwd = hashpw(enc_pwd, bcrypt.gensalt(rounds or bcrypt_rounds()))
     return hash_pwd
 
 
-def is_valid(hashed_password: bytes, password: str) -> bool:
+def needs_rehash(hashed_password: bytes, rounds: int = None) -> bool:
+    """
+    Check whether a hash was made with another cost than the target one
+    Args:
+        hashed_password (bytes): hashed password
+        rounds (int): target cost factor, defaults to bcrypt_rounds()
+    Return:
+        bool
+    """
+    try:
+        cost = int(hashed_password.split(b'$')[2])
+    except (IndexError, ValueError):
+        return False
+    return cost != (rounds or bcrypt_rounds())
+
+
+def is_valid(hashed_password: bytes, password: str,
+             on_rehash: Callable[[bytes], None] = None) -> bool:
     """
     Check whether a password is valid
+    When the password matches a hash made with another cost than the
+    configured one, a new hash is computed and passed to on_rehash so
+    that the caller can store it
     Args:
         hashed_password (bytes): hashed password
         password (str): password in string
+        on_rehash: callable receiving the upgraded hash
     Return:
         bool
     """
-    return bcrypt.checkpw(password.encode(), hashed_password)
+    valid = bcrypt.checkpw(password.encode(), hashed_password)
+    if valid and on_rehash is not None and needs_rehash(hashed_password):
+        on_rehash(hash_password(password))
+    return valid
+
+
+def _hash_with_rounds(rounds: int, password: str) -> bytes:
+    """
+    Returns a hashed password using a salt of the given cost
+    """
+    return hashpw(password.encode(), bcrypt.gensalt(rounds))
+
+
+def _check_pair(pair: Tuple[bytes, str]) -> bool:
+    """
+    Checks a (hashed_password, password) pair
+    """
+    return is_valid(*pair)
+
+
+def _ordered_map(func: Callable, items: Iterable, workers: int,
+                 processes: bool) -> Iterator:
+    """
+    Applies func to items on a pool and yields the results in input order
+    At most two items per worker are in flight, so items can be a lazy
+    iterable of any length
+    Args:
+        func: picklable callable applied to every item
+        items: the inputs
+        workers: size of the pool, defaults to the CPU count
+        processes: use a process pool instead of a thread pool
+    """
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+            pending.append(executor.submit(func, item))
+        while pending:
+            yield pending.popleft().result()
+
+
+def hash_passwords(passwords: Iterable[str], rounds: int = None,
+                   workers: int = None,
+                   processes: bool = False) -> Iterator[bytes]:
+    """
+    Hashes many passwords in parallel
+    bcrypt releases the GIL while hashing, so a thread pool already uses
+    every core; processes=True is available for interpreters where it
+    does not
+    Args:
+        passwords: iterable of passwords to be hashed
+        rounds: bcrypt cost factor, defaults to bcrypt_rounds()
+        workers: number of threads or processes, defaults to CPU count
+        processes: use a process pool instead of a thread pool
+    Return:
+        iterator of hashed passwords, in the order of passwords
+    """
+    rounds = rounds or bcrypt_rounds()
+    return _ordered_map(partial(_hash_with_rounds, rounds), passwords,
+                        workers, processes)
+
+
+def verify_many(pairs: Iterable[Tuple[bytes, str]], workers: int = None,
+                processes: bool = False) -> Iterator[bool]:
+    """
+    Checks many passwords against their hashes in parallel
+    Args:
+        pairs: iterable of (hashed_password, password) tuples
+        workers: number of threads or processes, defaults to CPU count
+        processes: use a process pool instead of a thread pool
+    Return:
+        iterator of booleans, in the order of pairs
+    """
+    return _ordered_map(_check_pair, pairs, workers, processes)
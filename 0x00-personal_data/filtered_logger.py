@@ -2,13 +2,31 @@
 
 """"The module defines the filtered datum function"""
 import re
-from typing import List
+import copy
+import atexit
+import queue
+import threading
+from functools import lru_cache
+from collections import deque
+from typing import Callable, List, Mapping, Optional, Sequence, Tuple
 import logging
+import logging.handlers
 import os
+import sys
+import time
+import weakref
 import mysql.connector
 
 
 PII_FIELDS = ('name', 'email', 'phone', 'ssn', 'password')
+BATCH_SIZE = 1000
+LOG_QUEUE_SIZE = 10000
+LOG_FILE = "user_data.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+DB_POOL_SIZE = 5
+DB_POOL_MAX_IDLE = 300.0
+DB_POOL_TIMEOUT = 30.0
 
 
 class RedactingFormatter(logging.Formatter):
@@ -22,20 +40,192 @@ class RedactingFormatter(logging.Formatter):
     def __init__(self, fields: List[str]):
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self._templates = {}
 
     def format(self, record: logging.LogRecord) -> str:
-        """Filter values in incoming log records using filter_datum"""
+        """Filter values in incoming log records using filter_datum
+
+            Records whose msg is a row mapping, or a row sequence logged
+            with extra={"columns": ...}, are masked by column instead
+        """
+        if isinstance(record.msg, Mapping) or hasattr(record, "columns"):
+            return self.format_row(record)
         msg = super(RedactingFormatter, self).format(record)
         redacted = filter_datum(self.fields, RedactingFormatter.REDACTION,
                                 msg, RedactingFormatter.SEPARATOR)
         return redacted
 
+    def format_row(self, record: logging.LogRecord) -> str:
+        """Formats a structured row record without any regex pass
+
+            The PII columns are replaced by REDACTION from their index,
+            so the row never goes through a "k=v;" string and back
+        """
+        row = record.msg
+        columns = getattr(record, "columns", None)
+        if columns is None:
+            columns, row = tuple(row.keys()), tuple(row.values())
+        template, kept = self._row_template(tuple(columns))
+        record = copy.copy(record)
+        record.msg = template.format(*[row[i] for i in kept])
+        record.args = None
+        return super(RedactingFormatter, self).format(record)
+
+    def _row_template(self,
+                      columns: Tuple[str, ...]) -> Tuple[str, List[int]]:
+        """Returns the message template of a row and the unmasked indexes
+
+            Templates are cached per column tuple, so a result set pays
+            for the column lookup once and not once per row
+        """
+        cached = self._templates.get(columns)
+        if cached is not None:
+            return cached
+        parts = []
+        kept = []
+        for i, column in enumerate(columns):
+            name = str(column).replace("{", "{{").replace("}", "}}")
+            if column in self.fields:
+                value = self.REDACTION.replace("{", "{{").replace("}", "}}")
+            else:
+                value = "{}"
+                kept.append(i)
+            parts.append(name + "=" + value + self.SEPARATOR)
+        cached = (" ".join(parts), kept)
+        self._templates[columns] = cached
+        return cached
+
+
+TRIE_THRESHOLD = 32
+
+
+class FieldTrie:
+    """Matches field values with a trie of the reversed field names
+
+        Instead of trying every field name at every position of the
+        message like a regex alternation does, the message is scanned for
+        '=' and the characters before each one are walked back through
+        the trie, so the cost of a line depends on its length and not on
+        how many fields are redacted
+    """
+
+    def __init__(self, fields: Tuple[str, ...], separator: str):
+        """Builds the trie of reversed field names
+
+            Args
+                fields: a tuple of strings representing fields to ofuscate
+                separator: represents a string which separate all strings
+                            in the log line
+        """
+        self.separator = separator
+        self.root = {}
+        for field in fields:
+            node = self.root
+            for char in reversed(field):
+                node = node.setdefault(char, {})
+            node[None] = True
+
+    def _ends_with_field(self, message: str, eq: int, start: int) -> bool:
+        """Checks whether a field name ends right before message[eq]
+
+            Args
+                message: represents the log line to ofuscate
+                eq: index of the '=' following the candidate field name
+                start: the lowest index the field name may start at
+        """
+        node = self.root
+        if None in node:
+            return True
+        i = eq - 1
+        while i >= start:
+            node = node.get(message[i])
+            if node is None:
+                return False
+            if None in node:
+                return True
+            i -= 1
+        return False
+
+    def sub(self, redaction: str, message: str) -> str:
+        """Returns the message with the value of every field redacted
+
+            Args
+                redaction: represent the string by what the field
+                            will be ofuscated
+                message: represents the log line to ofuscate
+        """
+        separator = self.separator
+        parts = []
+        last = 0
+        newline = -1
+        eq = message.find('=')
+        while eq != -1:
+            if self._ends_with_field(message, eq, last):
+                # a value never spans lines, so the separator is only
+                # looked for up to the end of the line of the '='
+                if newline < eq:
+                    newline = message.find('\n', eq + 1)
+                    if newline == -1:
+                        newline = len(message)
+                end = message.find(separator, eq + 1,
+                                   newline + len(separator))
+                if end != -1:
+                    parts.append(message[last:eq + 1])
+                    parts.append(redaction + separator)
+                    last = end + len(separator)
+                    eq = message.find('=', last)
+                    continue
+            eq = message.find('=', eq + 1)
+        if not parts:
+            return message
+        parts.append(message[last:])
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=None)
+def _redaction_pattern(fields: Tuple[str, ...],
+                       separator: str) -> "re.Pattern":
+    """Compiles a single regex matching the value of any of the fields
+
+        The pattern is built once per distinct (fields, separator) pair
+        so that a log line is scanned in one pass instead of once per field
+
+        Args
+            fields: a tuple of strings representing fields to ofuscate
+            separator: represents a string which separate all strings
+                        in the log line
+    """
+    names = '|'.join(re.escape(field) for field in fields)
+    sep = re.escape(separator)
+    return re.compile('(' + names + ')=.*?' + sep)
+
+
+@lru_cache(maxsize=None)
+def _field_trie(fields: Tuple[str, ...],
+                separator: str) -> Optional[FieldTrie]:
+    """Builds the FieldTrie once per distinct (fields, separator) pair,
+        or returns None when the regex is to be used: for short field
+        lists, and when a field name contains '='
+
+        Args
+            fields: a tuple of strings representing fields to ofuscate
+            separator: represents a string which separate all strings
+                        in the log line
+    """
+    if len(fields) <= TRIE_THRESHOLD or any('=' in f for f in fields):
+        return None
+    return FieldTrie(fields, separator)
+
 
 def filter_datum(fields: List[str], redaction: str,
                  message: str, separator: str) -> str:
     """The function uses regex to replace occurences of certain
         field values
 
+        Short field lists use one compiled alternation regex; past
+        TRIE_THRESHOLD fields a FieldTrie is used so that the cost
+        stays flat as the list grows
+
         Args
             fields: a list of string representing fields to ofuscate
             redaction: represent the string by what the field
@@ -44,29 +234,345 @@ def filter_datum(fields: List[str], redaction: str,
             separator: represents a string which separate all strings
                         in the log line
     """
-    for field in fields:
-        message = re.sub(field + '=.*?' + separator,
-                         field + '=' + redaction + separator, message)
-    return message
+    if not fields:
+        return message
+    fields = tuple(fields)
+    trie = _field_trie(fields, separator)
+    if trie is not None:
+        return trie.sub(redaction, message)
+    pattern = _redaction_pattern(fields, separator)
+    return pattern.sub(lambda m: m.group(1) + '=' + redaction + separator,
+                       message)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """ QueueHandler that leaves formatting and redaction to the
+        listener thread and applies an overflow policy on a full queue
+        """
+
+    POLICIES = ("block", "drop")
+
+    def __init__(self, log_queue: queue.Queue, policy: str = "block"):
+        """Initializes the handler
+
+            Args
+                log_queue: the bounded queue records are put on
+                policy: "block" waits for room in the queue (backpressure),
+                        "drop" discards the record and counts it
+        """
+        if policy not in self.POLICIES:
+            raise ValueError("unknown overflow policy: {}".format(policy))
+        super(BoundedQueueHandler, self).__init__(log_queue)
+        self.policy = policy
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Returns the record untouched so the caller never formats it"""
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Puts the record on the queue according to the overflow policy"""
+        if self.policy == "drop":
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+        else:
+            self.queue.put(record)
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """ QueueListener whose stop waits for room in a full queue, so that
+        every record queued before shutdown is still written
+        """
+
+    def enqueue_sentinel(self) -> None:
+        """Puts the stop sentinel on the queue, blocking if it is full"""
+        self.queue.put(self._sentinel)
+
+
+def _env_number(name: str, default, cast: Callable = int):
+    """Returns the environment variable name converted by cast, or
+        default when it is unset or not a valid number
+    """
+    try:
+        return cast(os.getenv(name))
+    except (TypeError, ValueError):
+        return default
+
+
+def _queue_handler(target: logging.Handler) -> BoundedQueueHandler:
+    """Wraps target behind a bounded queue drained by a listener thread
+
+        The queue size and overflow policy are read from
+        PERSONAL_DATA_LOG_QUEUE_SIZE and PERSONAL_DATA_LOG_OVERFLOW, and
+        the listener is stopped, flushing the queue, at interpreter exit
+    """
+    size = _env_number('PERSONAL_DATA_LOG_QUEUE_SIZE', LOG_QUEUE_SIZE)
+    policy = os.getenv('PERSONAL_DATA_LOG_OVERFLOW') or "block"
+    log_queue = queue.Queue(max(size, 1))
+    handler = BoundedQueueHandler(log_queue, policy)
+    listener = FlushingQueueListener(log_queue, target,
+                                     respect_handler_level=True)
+    handler.listener = listener
+    listener.start()
+    atexit.register(listener.stop)
+    return handler
+
+
+_SINK_HANDLERS = {}
+_SINK_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _formatter(fields: Tuple[str, ...]) -> RedactingFormatter:
+    """Returns the RedactingFormatter shared by every handler that
+        redacts the given fields
+    """
+    return RedactingFormatter(fields)
+
+
+def _sink_handler(sink: str, filename: str) -> logging.Handler:
+    """Creates the handler writing to a sink
+
+        Args
+            sink: "stream" for stderr or "file" for a rotating log file
+            filename: path of the log file for the "file" sink, the
+                      rotation is set by PERSONAL_DATA_LOG_MAX_BYTES and
+                      PERSONAL_DATA_LOG_BACKUP_COUNT
+    """
+    if sink == "stream":
+        return logging.StreamHandler()
+    if sink == "file":
+        max_bytes = _env_number('PERSONAL_DATA_LOG_MAX_BYTES',
+                                LOG_MAX_BYTES)
+        backups = _env_number('PERSONAL_DATA_LOG_BACKUP_COUNT',
+                              LOG_BACKUP_COUNT)
+        return logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backups)
+    raise ValueError("unknown log sink: {}".format(sink))
 
 
-def get_logger() -> logging.Logger:
+def get_logger(sink: str = "stream", queued: bool = False,
+               filename: str = None) -> logging.Logger:
     '''returns a logging.Logger object
+
+        The logger is configured once and every sink gets a single
+        redacting handler, so calling get_logger repeatedly, e.g. per
+        request, neither duplicates lines nor grows its cost
+
+        Args
+            sink: "stream" for stderr or "file" for a rotating log file
+            queued: when True, records are handed to a background thread
+                    through a bounded queue, so redaction and stream
+                    writes are kept out of the calling thread
+            filename: path of the log file for the "file" sink, defaults
+                      to PERSONAL_DATA_LOG_FILE or LOG_FILE
+
+        Raises
+            ValueError: when the sink was already set up with the other
+                        queued setting
     '''
+    if sink == "file":
+        filename = filename or os.getenv('PERSONAL_DATA_LOG_FILE') or LOG_FILE
+        filename = os.path.abspath(filename)
+    key = (sink, filename)
     logger = logging.getLogger("user_data")
+    if key not in _SINK_HANDLERS:
+        with _SINK_LOCK:
+            if key not in _SINK_HANDLERS:
+                _add_sink_handler(logger, key, queued)
+    if isinstance(_SINK_HANDLERS[key], BoundedQueueHandler) != queued:
+        raise ValueError("log sink {} is already set up with queued={}"
+                         .format(key, not queued))
+    return logger
+
+
+def _add_sink_handler(logger: logging.Logger, key: Tuple[str, str],
+                      queued: bool) -> None:
+    """Configures logger and gives it the redacting handler of a sink
+
+        Args
+            logger: the "user_data" logger
+            key: the (sink, filename) pair of the sink
+            queued: whether records go through a bounded queue
+    """
+    sink, filename = key
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
-    handler = logging.StreamHandler()
-    fmt = RedactingFormatter(PII_FIELDS)
-
-    handler.setFormatter(fmt)
+    handler = _sink_handler(sink, filename)
+    handler.setFormatter(_formatter(PII_FIELDS))
+    if queued:
+        handler = _queue_handler(handler)
     logger.addHandler(handler)
+    _SINK_HANDLERS[key] = handler
 
-    return logger
 
+class PooledConnection:
+    """ Connection borrowed from a ConnectionPool
+
+        Every attribute is delegated to the underlying connection, except
+        close() which hands it back to the pool. It can also be used as a
+        context manager that releases the connection on exit. A wrapper
+        garbage-collected without being closed closes its connection and
+        frees its slot in the pool
+        """
+
+    def __init__(self, pool: "ConnectionPool", conn):
+        """Wraps conn, a connection borrowed from pool"""
+        self._pool = pool
+        self._conn = conn
+        self._finalizer = weakref.finalize(self, pool.discard, conn)
 
-def get_db() -> mysql.connector.connection.MySQLConnection:
+    def __getattr__(self, name: str):
+        """Delegates attribute access to the underlying connection"""
+        if self._conn is None:
+            raise AttributeError("connection was returned to the pool")
+        return getattr(self._conn, name)
+
+    def __enter__(self) -> "PooledConnection":
+        """Returns the borrowed connection"""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Returns the connection to the pool"""
+        self.close()
+
+    def close(self) -> None:
+        """Returns the connection to the pool instead of closing it"""
+        conn, self._conn = self._conn, None
+        if conn is not None and self._finalizer.detach() is not None:
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    """ Bounded pool of database connections
+
+        Idle connections are reused most recently released first; those
+        idle for longer than max_idle seconds, or failing a pre-ping, are
+        closed and replaced by a fresh one from factory
+        """
+
+    def __init__(self, factory: Callable, size: int = DB_POOL_SIZE,
+                 max_idle: float = DB_POOL_MAX_IDLE):
+        """Initializes the pool
+
+            Args
+                factory: callable returning a new DB-API connection
+                size: maximum number of connections open at once
+                max_idle: seconds after which an idle connection is dropped
+        """
+        self.factory = factory
+        self.size = size
+        self.max_idle = max_idle
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self, timeout: float = None) -> PooledConnection:
+        """Borrows a healthy connection, blocking while all are in use
+
+            Args
+                timeout: seconds to wait for a free connection, forever
+                         when None
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("no database connection available")
+        try:
+            conn = self._take_idle()
+            if conn is None:
+                conn = self.factory()
+        except BaseException:
+            self._slots.release()
+            raise
+        return PooledConnection(self, conn)
+
+    def connection(self, timeout: float = None) -> PooledConnection:
+        """Borrows a connection for use in a with statement"""
+        return self.acquire(timeout)
+
+    def release(self, conn) -> None:
+        """Puts a borrowed connection back in the pool
+
+            Its open transaction is rolled back and its session reset, so
+            that the next borrower starts clean; a connection that fails
+            to reset is closed instead
+        """
+        try:
+            _reset(conn)
+        except Exception:
+            self.discard(conn)
+            return
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+        self._slots.release()
+
+    def discard(self, conn) -> None:
+        """Closes a borrowed connection and frees its slot"""
+        _close_quietly(conn)
+        self._slots.release()
+
+    def close(self) -> None:
+        """Closes every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+    def _take_idle(self):
+        """Returns the most recently released healthy connection or None
+
+            Connections idle for longer than max_idle sit at the left end
+            of the deque and are closed on the way
+        """
+        while True:
+            now = time.monotonic()
+            expired = []
+            conn = None
+            with self._lock:
+                while self._idle and now - self._idle[0][1] > self.max_idle:
+                    expired.append(self._idle.popleft()[0])
+                if self._idle:
+                    conn = self._idle.pop()[0]
+            for old in expired:
+                _close_quietly(old)
+            if conn is None or _is_alive(conn):
+                return conn
+            _close_quietly(conn)
+
+
+def _is_alive(conn) -> bool:
+    """Pre-pings a connection before it is handed out again"""
+    try:
+        if hasattr(conn, "is_connected"):
+            return bool(conn.is_connected())
+        if hasattr(conn, "ping"):
+            conn.ping()
+        return True
+    except Exception:
+        return False
+
+
+def _reset(conn) -> None:
+    """Rolls back the open transaction of a connection, reading any
+        unread result, and resets its session when the driver supports it
+    """
+    if hasattr(conn, "rollback"):
+        conn.rollback()
+    if hasattr(conn, "reset_session"):
+        conn.reset_session()
+
+
+def _close_quietly(conn) -> None:
+    """Closes a connection, ignoring errors from a dead one"""
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _connect() -> mysql.connector.connection.MySQLConnection:
     '''Connects to a MySQL server
     '''
     db_user = os.getenv('PERSONAL_DATA_DB_USERNAME') or "root"
@@ -82,22 +588,99 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     return db_conn
 
 
+_DB_POOL = None
+_DB_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    '''Returns the process wide pool of MySQL connections
+
+        The pool size and idle timeout are read from
+        PERSONAL_DATA_DB_POOL_SIZE and PERSONAL_DATA_DB_POOL_MAX_IDLE
+    '''
+    global _DB_POOL
+    if _DB_POOL is None:
+        with _DB_POOL_LOCK:
+            if _DB_POOL is None:
+                size = _env_number('PERSONAL_DATA_DB_POOL_SIZE',
+                                   DB_POOL_SIZE)
+                max_idle = _env_number('PERSONAL_DATA_DB_POOL_MAX_IDLE',
+                                       DB_POOL_MAX_IDLE, float)
+                _DB_POOL = ConnectionPool(_connect, max(size, 1), max_idle)
+    return _DB_POOL
+
+
+def get_db(timeout: float = None) -> PooledConnection:
+    '''Returns a MySQL connection borrowed from the pool
+
+        The MySQLConnection is wrapped in a PooledConnection: closing it,
+        or leaving a with block using it, returns the connection to the
+        pool instead of closing the socket
+
+        Args
+            timeout: seconds to wait for a free connection, defaults to
+                     PERSONAL_DATA_DB_POOL_TIMEOUT or DB_POOL_TIMEOUT
+
+        Raises
+            TimeoutError: when no connection frees up in time
+    '''
+    if timeout is None:
+        timeout = _env_number('PERSONAL_DATA_DB_POOL_TIMEOUT',
+                              DB_POOL_TIMEOUT, float)
+    return get_pool().acquire(timeout)
+
+
+def export_rows(cursor, logger: logging.Logger,
+                batch_size: int = BATCH_SIZE) -> int:
+    """
+    logs every row of an executed cursor as a structured record,
+    fetching batch_size rows at a time so that memory stays bounded
+    whatever the size of the result set
+
+    Args
+        cursor: a DB-API cursor on which a query has been executed
+        logger: the logger the rows are written to
+        batch_size: number of rows fetched per round trip
+    Return
+        the number of rows exported
+    """
+    columns = getattr(cursor, "column_names", None)
+    if columns is None:
+        columns = tuple(desc[0] for desc in cursor.description)
+    extra = {"columns": columns}
+    count = 0
+    rows = cursor.fetchmany(batch_size)
+    while rows:
+        for row in rows:
+            logger.info(row, extra=extra)
+        count += len(rows)
+        rows = cursor.fetchmany(batch_size)
+    return count
+
+
 def main():
     """
     obtains a database connection using get_db,
     retrieves all rows in the users table and displays
     each row under a filtered format
+
+    The rows are streamed through an unbuffered cursor in batches of
+    PERSONAL_DATA_BATCH_SIZE rows and the export rate is reported on
+    stderr
     """
+    batch_size = _env_number('PERSONAL_DATA_BATCH_SIZE', BATCH_SIZE)
     db = get_db()
     logger = get_logger()
-    cursor = db.cursor()
+    cursor = db.cursor(buffered=False)
+    start = time.perf_counter()
     cursor.execute("SELECT * FROM users;")
-    fields = cursor.column_names
-    for row in cursor:
-        message = "".join("{}={}; ".format(k, v) for k, v in zip(fields, row))
-        logger.info(message.strip())
+    count = export_rows(cursor, logger, max(batch_size, 1))
+    elapsed = time.perf_counter() - start
     cursor.close()
     db.close()
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print("exported {} rows in {:.3f}s ({:.0f} rows/sec)".format(
+        count, elapsed, rate), file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Scrubs PII out of existing log files with the rules of filtered_logger
+
+The input file is memory-mapped and split on line boundaries into
+chunks that are redacted across a pool of processes, and the chunks are
+written back in their original order.
+
+Usage: ./scrub_logs.py [-o OUTPUT] [-f FIELDS] [-w WORKERS] INPUT
+"""
+import argparse
+import mmap
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Sequence, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, filter_datum
+
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def chunk_bounds(data: mmap.mmap, chunk_size: int) -> List[Tuple[int, int]]:
+    """
+    Splits a mapped file into (start, end) offsets of about chunk_size
+    bytes, every chunk ending right after a newline or at end of file
+    Args:
+        data: the memory-mapped input
+        chunk_size: the target size of a chunk in bytes
+    Return:
+        list of (start, end) offsets covering the whole input
+    """
+    bounds = []
+    size = len(data)
+    start = 0
+    while start < size:
+        end = min(start + chunk_size, size)
+        if end < size:
+            newline = data.find(b'\n', end - 1)
+            end = size if newline == -1 else newline + 1
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def redact_chunk(path: str, start: int, end: int, fields: Sequence[str],
+                 redaction: str, separator: str) -> bytes:
+    """
+    Redacts one chunk of the input file
+    The worker maps the file itself, so only offsets cross the process
+    boundary on the way in
+    Args:
+        path: path of the input log file
+        start: offset of the first byte of the chunk
+        end: offset right after the last byte of the chunk
+        fields: the fields whose values are redacted
+        redaction: the string the values are replaced with
+        separator: the string separating fields in a log line
+    Return:
+        the redacted chunk
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            text = data[start:end].decode('utf-8', 'surrogateescape')
+    text = filter_datum(fields, redaction, text, separator)
+    return text.encode('utf-8', 'surrogateescape')
+
+
+def scrub(path: str, out: BinaryIO, fields: Sequence[str],
+          redaction: str = RedactingFormatter.REDACTION,
+          separator: str = RedactingFormatter.SEPARATOR,
+          workers: int = None, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Redacts the log file at path into out, preserving line order
+    At most two chunks per worker are in flight, so memory stays bounded
+    whatever the size of the input
+    Args:
+        path: path of the input log file
+        out: binary stream the redacted log is written to
+        fields: the fields whose values are redacted
+        redaction: the string the values are replaced with
+        separator: the string separating fields in a log line
+        workers: number of processes, 1 redacts in the calling process
+        chunk_size: the target size of a chunk in bytes
+    Return:
+        the number of bytes read from the input
+    """
+    fields = tuple(fields)
+    workers = workers or os.cpu_count() or 1
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            bounds = chunk_bounds(data, chunk_size)
+    args = (fields, redaction, separator)
+    if workers == 1:
+        for start, end in bounds:
+            out.write(redact_chunk(path, start, end, *args))
+        return bounds[-1][1]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in _ordered(executor, path, bounds, args, workers * 2):
+            out.write(chunk)
+    return bounds[-1][1]
+
+
+def _ordered(executor: ProcessPoolExecutor, path: str,
+             bounds: List[Tuple[int, int]], args: tuple,
+             window: int) -> Iterator[bytes]:
+    """
+    Yields redacted chunks in input order, keeping at most window chunks
+    submitted to the executor at any time
+    """
+    pending = deque()
+    for start, end in bounds:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(redact_chunk, path, start, end,
+                                       *args))
+    while pending:
+        yield pending.popleft().result()
+
+
+def main() -> None:
+    """
+    Parses the command line and scrubs the given log file
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('input', help="log file to scrub")
+    parser.add_argument('-o', '--output', default='-',
+                        help="where to write the result, - for stdout")
+    parser.add_argument('-f', '--fields', default=','.join(PII_FIELDS),
+                        help="comma separated fields to redact")
+    parser.add_argument('-r', '--redaction',
+                        default=RedactingFormatter.REDACTION)
+    parser.add_argument('-s', '--separator',
+                        default=RedactingFormatter.SEPARATOR)
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="number of processes, defaults to CPU count")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help="target chunk size in bytes")
+    opts = parser.parse_args()
+
+    fields = [f for f in opts.fields.split(',') if f]
+    if opts.output == '-':
+        out = sys.stdout.buffer
+        scrub(opts.input, out, fields, opts.redaction, opts.separator,
+              opts.workers, max(opts.chunk_size, 1))
+        out.flush()
+    else:
+        with open(opts.output, 'wb') as out:
+            scrub(opts.input, out, fields, opts.redaction, opts.separator,
+                  opts.workers, max(opts.chunk_size, 1))
+
+
+if __name__ == "__main__":
+    main()
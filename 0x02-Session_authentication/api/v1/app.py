@@ -3,6 +3,8 @@
 Route module for the API
 """
 from os import getenv
+from api.v1.auth.auth import PathMatcher
+from api.v1.auth.context import current_user
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
@@ -30,6 +32,13 @@ elif AUTH_TYPE == "session_db_auth":
     from api.v1.auth.session_db_auth import SessionDBAuth
     auth = SessionDBAuth()
 
+EXCLUDED_PATHS = PathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+    '/api/v1/auth_session/login/'
+])
+
 
 @app.before_request
 def bef_req():
@@ -39,18 +48,13 @@ def bef_req():
     if auth is None:
         pass
     else:
-        setattr(request, "current_user", auth.current_user(request))
-        excluded = [
-            '/api/v1/status/',
-            '/api/v1/unauthorized/',
-            '/api/v1/forbidden/',
-            '/api/v1/auth_session/login/'
-        ]
-        if auth.require_auth(request.path, excluded):
+        user = current_user(auth)
+        setattr(request, "current_user", user)
+        if auth.require_auth(request.path, EXCLUDED_PATHS):
             cookie = auth.session_cookie(request)
             if auth.authorization_header(request) is None and cookie is None:
                 abort(401, description="Unauthorized")
-            if auth.current_user(request) is None:
+            if user is None:
                 abort(403, description="Forbidden")
 
 
@@ -3,43 +3,102 @@
 Definition of class Auth
 """
 import os
+from functools import lru_cache
 from flask import request
 from typing import (
+    Iterable,
     List,
-    TypeVar
+    TypeVar,
+    Union
 )
 
 
+class PathMatcher:
+    """
+    Set of excluded paths compiled into a character trie
+
+    A path is excluded when an excluded path starts with it, when it
+    starts with an excluded path, or when it starts with the part of an
+    excluded path before a trailing '*'. All three are answered by one
+    walk down the trie, whatever the number of excluded paths, and the
+    latest decisions are cached
+    """
+    END = None
+
+    def __init__(self, excluded_paths: Iterable[str],
+                 cache_size: int = 1024):
+        """
+        Compiles excluded_paths
+        Args:
+            - excluded_paths(iterable of str): paths that do not require
+              authentication
+            - cache_size(int): number of decisions to remember
+        """
+        self.excluded_paths = tuple(excluded_paths)
+        self.trie = {}
+        for excluded in self.excluded_paths:
+            node = self.trie
+            for char in excluded:
+                node = node.setdefault(char, {})
+            node[self.END] = True
+            if excluded and excluded[-1] == '*':
+                self._node(excluded[:-1])[self.END] = True
+        self.is_excluded = lru_cache(maxsize=cache_size)(self._is_excluded)
+
+    def __len__(self) -> int:
+        """
+        Number of excluded paths
+        """
+        return len(self.excluded_paths)
+
+    def _node(self, prefix: str) -> dict:
+        """
+        Trie node reached by prefix
+        """
+        node = self.trie
+        for char in prefix:
+            node = node[char]
+        return node
+
+    def _is_excluded(self, path: str) -> bool:
+        """
+        Walks path down the trie
+        Return:
+            - True if path is excluded, else False
+        """
+        node = self.trie
+        for char in path:
+            if self.END in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return True
+
+
 class Auth:
     """
     Manages the API authentication
     """
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], PathMatcher]) -> bool:
         """
         Determines whether a given path requires authentication or not
         Args:
             - path(str): Url path to be checked
-            - excluded_paths(List of str): List of paths that do not require
-              authentication
+            - excluded_paths(List of str or PathMatcher): List of paths
+              that do not require authentication, compiled once and
+              reused for every request when given as a PathMatcher
         Return:
             - True if path is not in excluded_paths, else False
         """
         if path is None:
             return True
-        elif excluded_paths is None or excluded_paths == []:
+        elif excluded_paths is None or len(excluded_paths) == 0:
             return True
-        elif path in excluded_paths:
-            return False
-        else:
-            for i in excluded_paths:
-                if i.startswith(path):
-                    return False
-                if path.startswith(i):
-                    return False
-                if i[-1] == "*":
-                    if path.startswith(i[:-1]):
-                        return False
-        return True
+        if not isinstance(excluded_paths, PathMatcher):
+            excluded_paths = _path_matcher(tuple(excluded_paths))
+        return not excluded_paths.is_excluded(path)
 
     def authorization_header(self, request=None) -> str:
         """
@@ -71,3 +130,10 @@ class Auth:
         session_name = os.getenv('SESSION_NAME')
         return request.cookies.get(session_name)
 
+
+@lru_cache(maxsize=32)
+def _path_matcher(excluded_paths: tuple) -> PathMatcher:
+    """
+    PathMatcher of excluded_paths, compiled once per list of paths
+    """
+    return PathMatcher(excluded_paths)
@@ -3,15 +3,109 @@
 Definition of class BasicAuth
 """
 import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
 from .auth import Auth
 from typing import TypeVar
 
 from models.user import User
 
 
+class CredentialCache:
+    """ Bounded LRU cache of verified Authorization headers
+
+    Headers are keyed by their HMAC under a per-process random key, so
+    the credentials themselves are never kept in memory. An entry maps
+    to the id of the user and to the email and password hash it was
+    verified against; it expires after ttl seconds and is dropped as soon
+    as the user is removed or its email or password changes
+    """
+    def __init__(self, size: int = 1024, ttl: float = 300):
+        """
+        Initialize an empty cache
+        Args:
+            size (int): maximum number of entries, 0 disables the cache
+            ttl (float): lifetime of an entry in seconds
+        """
+        self.size = size
+        self.ttl = ttl
+        self.secret = os.urandom(32)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _key(self, authorization_header: str) -> bytes:
+        """
+        HMAC of an Authorization header
+        """
+        return hmac.new(self.secret,
+                        authorization_header.encode('utf-8',
+                                                    'surrogatepass'),
+                        hashlib.sha256).digest()
+
+    def get(self, authorization_header: str) -> TypeVar('User'):
+        """
+        Returns the user verified for authorization_header, or None when
+        the header is unknown, expired or no longer valid for the user
+        """
+        if self.size <= 0:
+            return None
+        key = self._key(authorization_header)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user_id, email, password, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        user = User.get(user_id)
+        if user is None or user.email != email or \
+                user.password != password:
+            with self.lock:
+                self.entries.pop(key, None)
+            return None
+        return user
+
+    def put(self, authorization_header: str, user: TypeVar('User')):
+        """
+        Remembers that authorization_header was verified for user
+        """
+        if self.size <= 0:
+            return
+        key = self._key(authorization_header)
+        entry = (user.id, user.email, user.password,
+                 time.monotonic() + self.ttl)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
 class BasicAuth(Auth):
     """ Implement Basic Authorization protocol methods
     """
+    def __init__(self):
+        """
+        Initialize the cache of verified credentials, sized by
+        BASIC_AUTH_CACHE_SIZE and expiring after BASIC_AUTH_CACHE_TTL
+        seconds
+        """
+        try:
+            size = int(os.getenv('BASIC_AUTH_CACHE_SIZE', 1024))
+        except ValueError:
+            size = 1024
+        try:
+            ttl = float(os.getenv('BASIC_AUTH_CACHE_TTL', 300))
+        except ValueError:
+            ttl = 300
+        self.credential_cache = CredentialCache(size, ttl)
+
     def extract_base64_authorization_header(self,
                                             authorization_header: str) -> str:
         """
@@ -83,14 +177,23 @@ class BasicAuth(Auth):
     def current_user(self, request=None) -> TypeVar('User'):
         """
         Returns a User instance based on a received request
+        A header already verified is answered from the credential cache
+        without hashing the password again
         """
         Auth_header = self.authorization_header(request)
         if Auth_header is not None:
+            user = self.credential_cache.get(Auth_header)
+            if user is not None:
+                return user
             token = self.extract_base64_authorization_header(Auth_header)
             if token is not None:
                 decoded = self.decode_base64_authorization_header(token)
                 if decoded is not None:
                     email, pword = self.extract_user_credentials(decoded)
                     if email is not None:
-                        return self.user_object_from_credentials(email, pword)
+                        user = self.user_object_from_credentials(email,
+                                                                 pword)
+                        if user is not None:
+                            self.credential_cache.put(Auth_header, user)
+                        return user
         return
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Authentication context of the current request
+"""
+from flask import g, request
+from typing import TypeVar
+
+
+def current_user(auth=None) -> TypeVar('User'):
+    """
+    Returns the User authenticated by the current request
+    The user is resolved once per request with auth.current_user and kept
+    on flask.g, later calls return it without authenticating again
+    Args:
+        auth: Auth instance resolving the user on the first call
+    Return:
+        User instance or None
+    """
+    if 'current_user' not in g:
+        g.current_user = None if auth is None else auth.current_user(request)
+    return g.current_user
@@ -67,5 +67,7 @@ class SessionAuth(Auth):
         user_id = self.user_id_for_session_id(session_cookie)
         if user_id is None:
             return False
-        del self.user_id_by_session_id[session_cookie]
-        return True
+        # pop, unlike del, is safe when another request destroys the
+        # same session concurrently
+        return self.user_id_by_session_id.pop(session_cookie,
+                                              None) is not None
@@ -2,6 +2,8 @@
 """
 Define class SessionDButh
 """
+from datetime import datetime, timedelta
+
 from .session_exp_auth import SessionExpAuth
 from models.user_session import UserSession
 
@@ -10,8 +12,32 @@ class SessionDBAuth(SessionExpAuth):
     """
     Definition of SessionDBAuth class that persists session data
     in a database
+
+    Sessions in use are kept in user_id_by_session_id, where they expire
+    like those of SessionExpAuth; the others are read from the
+    UserSession store through its session_id index, so resolving a
+    session does not depend on the number of sessions. A session found
+    in user_id_by_session_id is still looked up in the store, so that it
+    stops authenticating once its UserSession is removed. With the json
+    engine the store is held in memory by each process: a session
+    removed by another process stays valid here until the store is
+    reloaded or the session expires
     """
 
+    def __init__(self):
+        """
+        Initialize the class and load the stored sessions
+        """
+        super().__init__()
+        UserSession.load_from_file()
+
+    def _now(self) -> datetime:
+        """
+        Returns the current time, in UTC like the created_at of
+        UserSession
+        """
+        return datetime.utcnow()
+
     def create_session(self, user_id=None):
         """
         Create a Session ID for a user_id
@@ -21,10 +47,13 @@ class SessionDBAuth(SessionExpAuth):
         session_id = super().create_session(user_id)
         if not session_id:
             return None
+        details = self.user_id_by_session_id.get(session_id)
         kw = {
             "user_id": user_id,
             "session_id": session_id
         }
+        if details is not None:
+            kw["created_at"] = details["created_at"]
         user = UserSession(**kw)
         user.save()
         return session_id
@@ -35,12 +64,36 @@ class SessionDBAuth(SessionExpAuth):
         Args:
             session_id (str): session ID
         Return:
-            user id or None if session_id is None or not a string
+            user id or None if session_id is None or not a string, or
+            if the session has expired
         """
-        user_id = UserSession.search({"session_id": session_id})
-        if user_id:
-            return user_id
-        return None
+        if session_id is None or not isinstance(session_id, str):
+            return None
+        user_id = super().user_id_for_session_id(session_id)
+        if user_id is not None:
+            if UserSession.search({"session_id": session_id}):
+                return user_id
+            self.user_id_by_session_id.pop(session_id, None)
+            return None
+        if session_id in self.user_id_by_session_id:
+            return None
+        user_sessions = UserSession.search({"session_id": session_id})
+        if not user_sessions:
+            return None
+        user_session = user_sessions[0]
+        created_at = user_session.created_at
+        if self.session_duration > 0:
+            deadline = created_at + timedelta(seconds=self.session_duration)
+            if deadline < self._now():
+                user_session.remove()
+                return None
+        self.user_id_by_session_id[session_id] = {
+            "user_id": user_session.user_id,
+            "created_at": created_at
+        }
+        if self.session_duration > 0:
+            self._push_expiry(deadline, session_id)
+        return user_session.user_id
 
     def destroy_session(self, request=None):
         """
@@ -52,8 +105,8 @@ class SessionDBAuth(SessionExpAuth):
         session_id = self.session_cookie(request)
         if not session_id:
             return False
+        cached = self.user_id_by_session_id.pop(session_id, None)
         user_session = UserSession.search({"session_id": session_id})
-        if user_session:
-            user_session[0].remove()
-            return True
-        return False
+        for session in user_session:
+            session.remove()
+        return bool(user_session) or cached is not None
@@ -2,7 +2,9 @@
 """
 Define SessionExpAuth class
 """
+import heapq
 import os
+import threading
 from datetime import (
     datetime,
     timedelta
@@ -15,6 +17,12 @@ class SessionExpAuth(SessionAuth):
     """
     Definition of class SessionExpAuth that adds an
     expiration date to a Session ID
+
+    Sessions are also pushed on a heap ordered by expiration date, so
+    that expired sessions are removed from user_id_by_session_id as soon
+    as they are due: on every create and lookup, and every
+    SESSION_REAP_INTERVAL seconds from a background thread when that
+    variable is set
     """
     def __init__(self):
         """
@@ -25,6 +33,24 @@ class SessionExpAuth(SessionAuth):
         except Exception:
             duration = 0
         self.session_duration = duration
+        self.expiry_heap = []
+        self.expired_count = 0
+        self.expiry_lock = threading.Lock()
+        self.reaper_stop = threading.Event()
+        try:
+            interval = float(os.getenv('SESSION_REAP_INTERVAL', 0))
+        except ValueError:
+            interval = 0
+        if interval > 0 and self.session_duration > 0:
+            reaper = threading.Thread(target=self._reap_every,
+                                      args=(interval,), daemon=True)
+            reaper.start()
+
+    def _now(self) -> datetime:
+        """
+        Returns the current time, as stored in created_at
+        """
+        return datetime.now()
 
     def create_session(self, user_id=None):
         """
@@ -35,13 +61,26 @@ class SessionExpAuth(SessionAuth):
         session_id = super().create_session(user_id)
         if session_id is None:
             return None
+        created_at = self._now()
         session_dictionary = {
             "user_id": user_id,
-            "created_at": datetime.now()
+            "created_at": created_at
         }
         self.user_id_by_session_id[session_id] = session_dictionary
+        if self.session_duration > 0:
+            deadline = created_at + timedelta(seconds=self.session_duration)
+            self._push_expiry(deadline, session_id)
         return session_id
 
+    def _push_expiry(self, deadline: datetime, session_id: str):
+        """
+        Schedules the removal of session_id at deadline, then reaps the
+        sessions already due
+        """
+        with self.expiry_lock:
+            heapq.heappush(self.expiry_heap, (deadline, session_id))
+        self.reap()
+
     def user_id_for_session_id(self, session_id=None):
         """
         Returns a user ID based on a session ID
@@ -52,6 +91,7 @@ class SessionExpAuth(SessionAuth):
         """
         if session_id is None:
             return None
+        self.reap()
         user_details = self.user_id_by_session_id.get(session_id)
         if user_details is None:
             return None
@@ -61,6 +101,59 @@ class SessionExpAuth(SessionAuth):
             return user_details.get("user_id")
         created_at = user_details.get("created_at")
         allowed_window = created_at + timedelta(seconds=self.session_duration)
-        if allowed_window < datetime.now():
+        if allowed_window < self._now():
             return None
         return user_details.get("user_id")
+
+    def reap(self) -> int:
+        """
+        Removes the sessions whose expiration date has passed
+        Only the top of the heap is looked at when nothing is due, and
+        each session is pushed and popped once
+        Return:
+            number of sessions removed
+        """
+        if not self.expiry_heap:
+            return 0
+        now = self._now()
+        reaped = 0
+        with self.expiry_lock:
+            heap = self.expiry_heap
+            while heap and heap[0][0] < now:
+                deadline, session_id = heapq.heappop(heap)
+                details = self.user_id_by_session_id.get(session_id)
+                # destroyed sessions leave their entry behind
+                if not isinstance(details, dict) or \
+                        details.get("created_at") is None:
+                    continue
+                expires = details["created_at"] + \
+                    timedelta(seconds=self.session_duration)
+                if expires != deadline:
+                    continue
+                self.user_id_by_session_id.pop(session_id, None)
+                reaped += 1
+            self.expired_count += reaped
+        return reaped
+
+    def _reap_every(self, interval: float):
+        """
+        Reaps expired sessions every interval seconds until
+        stop_reaper is called
+        """
+        while not self.reaper_stop.wait(interval):
+            self.reap()
+
+    def stop_reaper(self):
+        """
+        Stops the background reaper, if any
+        """
+        self.reaper_stop.set()
+
+    def session_counts(self) -> dict:
+        """
+        Returns the number of live sessions and the number of sessions
+        removed since start because they expired
+        """
+        self.reap()
+        return {"live": len(self.user_id_by_session_id),
+                "expired": self.expired_count}
@@ -37,8 +37,12 @@ def stats() -> str:
     """ GET /api/v1/stats
     Return:
       - the number of each objects
+      - the counters of the storage engine: count and index sizes of
+        each model, size of the store and latency of the last write
     """
+    from models.base import storage
     from models.user import User
     stats = {}
     stats['users'] = User.count()
+    stats['storage'] = storage().stats()
     return jsonify(stats)
@@ -1,19 +1,60 @@
 #!/usr/bin/env python3
 """ Module of Users views
 """
+import json
+from api.v1.auth.context import current_user
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request
 from models.user import User
 
 
+MAX_PAGE_SIZE = 1000
+
+
+def _stream_users(ndjson: bool):
+    """ Generate the body listing all users, one user at a time
+    """
+    if ndjson:
+        for user in User.iterate():
+            yield json.dumps(user.to_json()) + "\n"
+        return
+    sep = "["
+    for user in User.iterate():
+        yield sep + json.dumps(user.to_json())
+        sep = ","
+    yield "[]" if sep == "[" else "]"
+
+
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters:
+      - limit (optional): page size, up to MAX_PAGE_SIZE
+      - cursor (optional): next_cursor returned with the previous page
     Return:
-      - list of all User objects JSON represented
+      - list of all User objects JSON represented, streamed one user at
+        a time (as NDJSON if the client accepts application/x-ndjson)
+      - with limit: {"users": [...], "next_cursor": ...}, next_cursor
+        being null on the last page
+      - 400 if limit is not a positive integer
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is None and cursor is None:
+        best = request.accept_mimetypes.best_match(
+            ['application/json', 'application/x-ndjson'])
+        ndjson = best == 'application/x-ndjson'
+        mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+        return Response(_stream_users(ndjson), mimetype=mimetype)
+    try:
+        limit = int(limit) if limit is not None else MAX_PAGE_SIZE
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return jsonify({'error': "limit must be a positive integer"}), 400
+    users, next_cursor = User.page(min(limit, MAX_PAGE_SIZE), cursor)
+    return jsonify({'users': [user.to_json() for user in users],
+                    'next_cursor': next_cursor})
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -28,14 +69,14 @@ def view_one_user(user_id: str = None) -> str:
     if user_id is None:
         abort(404)
     if user_id == "me":
-        if request.current_user is None:
+        user = current_user()
+        if user is None:
             abort(404)
-        user = request.current_user
         return jsonify(user.to_json())
     user = User.get(user_id)
     if user is None:
         abort(404)
-    if request.current_user is None:
+    if current_user() is None:
         abort(404)
     return jsonify(user.to_json())
 
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Main 3
+"""
+import timeit
+from api.v1.auth.auth import Auth, PathMatcher
+
+
+auth = Auth()
+excluded = ["/api/v1/public/route{:04d}/".format(i) for i in range(1000)]
+excluded.append("/api/v1/static/*")
+matcher = PathMatcher(excluded)
+paths = ["/api/v1/users/{}".format(i) for i in range(100)]
+paths.extend(["/api/v1/public/route0999/", "/api/v1/static/app.css"])
+
+
+def linear():
+    """ Checks every path the way require_auth did before PathMatcher """
+    for path in paths:
+        for i in excluded:
+            if i.startswith(path) or path.startswith(i):
+                break
+            if i[-1] == "*" and path.startswith(i[:-1]):
+                break
+
+
+def compiled():
+    """ Checks every path against the compiled matcher """
+    for path in paths:
+        auth.require_auth(path, matcher)
+
+
+for func in (linear, compiled):
+    seconds = min(timeit.repeat(func, number=10, repeat=3))
+    print("{}: {:.2f} us per path with {} excluded paths".format(
+        func.__name__, seconds / 10 / len(paths) * 1e6, len(excluded)))
+print("require_auth('/api/v1/users/1'): {}".format(
+    auth.require_auth("/api/v1/users/1", matcher)))
+print("require_auth('/api/v1/static/app.css'): {}".format(
+    auth.require_auth("/api/v1/static/app.css", matcher)))
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Main 4
+Run with AUTH_TYPE=basic_auth
+"""
+import base64
+import time
+from api.v1.app import app, auth
+from models.user import User
+
+
+user = User()
+user.email = "bob@hbtn.io"
+user.password = "H0lbertonSchool98!"
+user.save()
+header = "Basic {}".format(base64.b64encode(
+    "bob@hbtn.io:H0lbertonSchool98!".encode("utf-8")).decode("utf-8"))
+
+resolve = auth.current_user
+stats = {"calls": 0, "seconds": 0.0}
+
+
+def counted_current_user(request=None):
+    """ Counts and times the calls to auth.current_user """
+    start = time.perf_counter()
+    result = resolve(request)
+    stats["seconds"] += time.perf_counter() - start
+    stats["calls"] += 1
+    return result
+
+
+auth.current_user = counted_current_user
+client = app.test_client()
+requests = 1000
+for _ in range(requests):
+    client.get("/api/v1/users/me", headers={"Authorization": header})
+print("current_user calls per request: {:.1f}".format(
+    stats["calls"] / requests))
+print("authentication time per request: {:.1f} us".format(
+    stats["seconds"] / requests * 1e6))
+user.remove()
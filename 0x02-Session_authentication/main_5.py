@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Main 5
+Soak test of SessionExpAuth: creates sessions on a simulated clock and
+prints the resident memory, which stays flat once sessions expire
+Usage: ./main_5.py [number of sessions, default 10000000]
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+from api.v1.auth.session_exp_auth import SessionExpAuth
+
+
+class SimulatedClock(SessionExpAuth):
+    """ SessionExpAuth whose clock moves 1 ms per created session """
+    start = datetime.now()
+    ticks = 0
+
+    def _now(self):
+        """ Returns the simulated time """
+        return self.start + timedelta(milliseconds=self.ticks)
+
+
+def rss() -> int:
+    """ Resident memory of the process in MiB """
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+
+
+os.environ["SESSION_DURATION"] = "60"
+sa = SimulatedClock()
+total = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+for i in range(1, total + 1):
+    sa.ticks = i
+    sa.create_session("user")
+    if i % (total // 10) == 0:
+        print("{} sessions created, {}, rss {} MiB".format(
+            i, sa.session_counts(), rss()))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Main 6
+Stress test of the model store: threads save, search and remove users
+concurrently, then the store is written, reloaded and compared
+UserSession is searched without ever being loaded, as SessionDBAuth
+does on login, which must find nothing rather than fail
+Usage: ./main_6.py [threads, default 16] [users per thread, default 100]
+"""
+import sys
+import threading
+from models.user import User
+from models.user_session import UserSession
+
+
+threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+User.load_from_file()
+start_count = User.count()
+errors = []
+kept = []
+
+
+def worker(n):
+    """ Saves users, searches them and removes a third of them """
+    mine = []
+    try:
+        if UserSession.search({"session_id": str(n)}) != []:
+            errors.append("unloaded UserSession store is not empty")
+        for i in range(per_thread):
+            user = User()
+            user.email = "stress-{}-{}@hbtn.io".format(n, i)
+            user.save()
+            mine.append(user)
+            found = User.search({"email": user.email})
+            if [u.id for u in found] != [user.id]:
+                errors.append("{} not found".format(user.email))
+            User.search({"first_name": None})
+            if i % 3 == 0:
+                mine.pop(0).remove()
+            if i % 50 == 0:
+                User.save_to_file()
+    except Exception as e:
+        errors.append(repr(e))
+    kept.extend(mine)
+
+
+workers = [threading.Thread(target=worker, args=(n,))
+           for n in range(threads)]
+for t in workers:
+    t.start()
+for t in workers:
+    t.join()
+
+count = User.count()
+expected = start_count + len(kept)
+User.save_to_file()
+User.flush()
+User.load_from_file()
+print("errors: {}".format(errors[:3]))
+print("count: {}, expected: {}, after reload: {}".format(
+    count, expected, User.count()))
+for user in kept:
+    user.remove()
+User.flush()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Main 7
+Startup benchmark: writes a store of N users, then times
+User.load_from_file() in a fresh interpreter with each JSON codec
+Usage: ./main_7.py [users, default 1000000]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import uuid
+
+
+LOAD = """
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+from models import codec
+from models.user import User
+User.load_from_file()
+print("{{}}: {{}} users loaded in {{:.2f}} s".format(
+    codec.BACKEND, User.count(), time.perf_counter() - start))
+"""
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+root = os.path.dirname(os.path.abspath(__file__))
+with tempfile.TemporaryDirectory() as tmp:
+    users = {}
+    for i in range(count):
+        user_id = str(uuid.uuid4())
+        users[user_id] = {
+            "id": user_id,
+            "created_at": "2024-01-01T00:00:00",
+            "updated_at": "2024-01-01T00:00:00",
+            "email": "user{}@hbtn.io".format(i),
+            "_password": "0" * 64,
+            "first_name": "First{}".format(i),
+            "last_name": "Last{}".format(i),
+        }
+    with open(os.path.join(tmp, ".db_User.json"), "w") as f:
+        json.dump(users, f)
+    del users
+    for backend in ("json", "ujson", "orjson"):
+        env = dict(os.environ, BASE_JSON_CODEC=backend,
+                   BASE_STORAGE_ENGINE="json")
+        out = subprocess.run([sys.executable, "-c", LOAD.format(root=root)],
+                             cwd=tmp, env=env, stdout=subprocess.PIPE,
+                             universal_newlines=True).stdout
+        if out.startswith(backend + ":"):
+            print(out.strip())
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""Main 8
+Measures with tracemalloc the memory taken by each User and UserSession
+instance, the attribute values being allocated beforehand
+Usage: ./main_8.py [objects, default 100000]
+"""
+import gc
+import sys
+import tracemalloc
+from models.user import User
+from models.user_session import UserSession
+
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+stamp = "2024-02-14T06:33:59"
+samples = {
+    User: [{"id": "id{}".format(i), "created_at": stamp,
+            "updated_at": stamp, "email": "u{}@hbtn.io".format(i),
+            "_password": "0" * 64} for i in range(count)],
+    UserSession: [{"id": "id{}".format(i), "created_at": stamp,
+                   "updated_at": stamp, "user_id": "u{}".format(i),
+                   "session_id": "s{}".format(i)} for i in range(count)],
+}
+for cls, kwargs in samples.items():
+    gc.collect()
+    tracemalloc.start()
+    objs = [cls(**kw) for kw in kwargs]
+    size = tracemalloc.get_traced_memory()[0] - sys.getsizeof(objs)
+    tracemalloc.stop()
+    print("{}: {} bytes per object, __dict__: {}".format(
+        cls.__name__, size // count, hasattr(objs[0], "__dict__")))
+    del objs
@@ -2,36 +2,95 @@
 """ Base module
 """
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
-import json
+from functools import lru_cache
+from typing import TypeVar, List, Iterable, Iterator, Optional, Tuple
+from os import getenv
+import atexit
+import threading
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
+
+STORAGE = None
+STORAGE_LOCK = threading.Lock()
+
+
+class Timestamp():
+    """ Datetime attribute kept as the string it was loaded from until it
+    is first read, so that loading a store does not parse every date.
+    The value lives in the slot named after the attribute with a leading
+    underscore
+    """
+
+    def __set_name__(self, owner: type, name: str):
+        """ Remember the attribute and slot names
+        """
+        self.name = name
+        self.slot = '_' + name
+
+    def __get__(self, obj: TypeVar('Base'), objtype: type = None):
+        """ Return the datetime, parsing the stored string on first read
+        """
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if isinstance(value, str):
+            value = datetime.strptime(value, TIMESTAMP_FORMAT)
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj: TypeVar('Base'), value):
+        """ Set a datetime or a TIMESTAMP_FORMAT string
+        """
+        setattr(obj, self.slot, value)
+
+
+@lru_cache(maxsize=None)
+def _fields(cls: type) -> Tuple[Tuple[str, str], ...]:
+    """ (key, slot) pairs of the attributes of cls serialized by to_json,
+    in declaration order from Base down to cls
+    """
+    fields = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        for slot in slots:
+            attr = getattr(cls, slot[1:], None) if slot[0] == '_' else None
+            if isinstance(attr, Timestamp) and attr.slot == slot:
+                fields.append((attr.name, slot))
+            elif slot not in ('__dict__', '__weakref__'):
+                fields.append((slot, slot))
+    return tuple(fields)
 
 
 class Base():
     """ Base class
+    Models declare their attributes in __slots__, which keeps instances
+    free of a per-object __dict__. Objects are kept by the engine
+    returned by storage()
     """
 
+    __slots__ = ('id', '_created_at', '_updated_at')
+    indexed_attributes = ()
+    ordered_attributes = ('created_at', 'updated_at')
+    created_at = Timestamp()
+    updated_at = Timestamp()
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
-        self.id = kwargs.get('id', str(uuid.uuid4()))
+        if 'id' in kwargs:
+            self.id = kwargs['id']
+        else:
+            self.id = str(uuid.uuid4())
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = kwargs.get('created_at')
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = kwargs.get('updated_at')
         else:
             self.updated_at = datetime.utcnow()
 
@@ -48,7 +107,15 @@ class Base():
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        items = []
+        for key, slot in _fields(type(self)):
+            try:
+                items.append((key, getattr(self, slot)))
+            except AttributeError:
+                continue
+        if hasattr(self, '__dict__'):
+            items.extend(self.__dict__.items())
+        for key, value in items:
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -61,52 +128,36 @@ class Base():
     def load_from_file(cls):
         """ Load all objects from file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        storage().load(cls)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        storage().save_to_file(cls)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def flush(cls):
+        """ Write the deferred changes of the class, if any, right away
+        """
+        storage().flush(cls)
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        storage().save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        storage().remove(self)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return storage().count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -114,24 +165,77 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def iterate(cls) -> Iterator[TypeVar('Base')]:
+        """ Yield all objects one by one
+        """
+        return storage().iterate(cls)
+
+    @classmethod
+    def page(cls, limit: int,
+             after: str = None) -> Tuple[List[TypeVar('Base')],
+                                         Optional[str]]:
+        """ Return up to limit objects ordered by id, starting after the
+        id after, along with the cursor of the next page (None on the
+        last page). Ids removed between two pages do not shift the pages
+        """
+        return storage().page(cls, limit, after)
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return storage().get(cls, id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+        return storage().search(cls, attributes)
+
+    @classmethod
+    def range(cls, attr: str, lo=None, hi=None) -> List[TypeVar('Base')]:
+        """ Return the objects with lo <= attr < hi, ordered by attr
+        attr must be one of ordered_attributes; a bound left to None is
+        open, datetime bounds are accepted for timestamps
+        """
+        return storage().range(cls, attr, lo, hi)
+
+
+def _sort_key(value):
+    """ Sort key of an attribute value, datetimes compare as strings in
+    TIMESTAMP_FORMAT
+    """
+    if type(value) is datetime:
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value
+
+
+def storage():
+    """ Storage engine of every model, created on first use
+    BASE_STORAGE_ENGINE selects it: 'json' (default) keeps the objects in
+    memory and writes them to .db_<Class>.json files, 'sqlite' keeps them
+    in the SQLite database at BASE_SQLITE_PATH
+    """
+    global STORAGE
+    if STORAGE is None:
+        with STORAGE_LOCK:
+            if STORAGE is None:
+                if getenv('BASE_STORAGE_ENGINE', 'json') == 'sqlite':
+                    from models.engine.sqlite_storage import SQLiteStorage
+                    STORAGE = SQLiteStorage(getenv('BASE_SQLITE_PATH',
+                                                   '.db.sqlite3'))
+                else:
+                    from models.engine.json_storage import JSONStorage
+                    STORAGE = JSONStorage()
+    return STORAGE
+
+
+def flush_all():
+    """ Write every deferred change, called at interpreter exit
+    """
+    if STORAGE is not None:
+        STORAGE.flush_all()
+
+
+atexit.register(flush_all)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+""" Codec module
+JSON encoding of the storage files, backed by orjson or ujson when one
+of them is installed and by the standard json module otherwise. The
+backend can be forced with BASE_JSON_CODEC (orjson, ujson or json)
+"""
+from os import getenv
+from typing import IO, Any
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _backend() -> str:
+    """ Name of the JSON backend to use
+    """
+    available = {'orjson': orjson, 'ujson': ujson, 'json': json}
+    name = getenv('BASE_JSON_CODEC')
+    if name in available and available[name] is not None:
+        return name
+    for name in ('orjson', 'ujson'):
+        if available[name] is not None:
+            return name
+    return 'json'
+
+
+BACKEND = _backend()
+
+
+def loads(data: str) -> Any:
+    """ Decode a JSON document
+    """
+    if BACKEND == 'orjson':
+        return orjson.loads(data)
+    if BACKEND == 'ujson':
+        return ujson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """ Encode obj as a JSON document
+    """
+    if BACKEND == 'orjson':
+        return orjson.dumps(obj).decode('utf-8')
+    if BACKEND == 'ujson':
+        return ujson.dumps(obj)
+    return json.dumps(obj)
+
+
+def load(f: IO[str]) -> Any:
+    """ Decode the JSON document of a text file
+    """
+    return loads(f.read())
+
+
+def dump(obj: Any, f: IO[str]):
+    """ Encode obj as a JSON document into a text file
+    """
+    f.write(dumps(obj))
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+""" JSONStorage module
+In-memory storage engine persisted to one .db_<Class>.json snapshot per
+class, optionally with an append-only journal of changes
+"""
+from os import getenv, path
+from typing import TypeVar, List, Iterator, Optional, Tuple
+import os
+import tempfile
+import threading
+import time
+
+from models import codec
+from models.base import Timestamp, _sort_key
+from models.index import HashIndex, SortedIndex
+
+
+ITERATE_SIZE = 1000
+
+# os.umask can only be read by setting it, which is done once here
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+class JSONStorage():
+    """ Keep every object in memory and persist each class to a JSON file
+
+    BASE_STORAGE_MODE selects how changes reach the disk: 'snapshot'
+    rewrites the whole file, 'journal' appends each change to
+    .db_<Class>.journal and compacts it into the snapshot every
+    BASE_JOURNAL_COMPACT_EVERY entries. BASE_WRITE_DELAY defers snapshot
+    writes by that many seconds so that a burst of saves costs one write
+    """
+
+    def __init__(self):
+        """ Initialize an empty storage configured from the environment
+        """
+        self.mode = getenv('BASE_STORAGE_MODE', 'snapshot')
+        try:
+            self.compact_every = int(getenv('BASE_JOURNAL_COMPACT_EVERY',
+                                            1000))
+        except ValueError:
+            self.compact_every = 1000
+        try:
+            self.write_delay = float(getenv('BASE_WRITE_DELAY', 0))
+        except ValueError:
+            self.write_delay = 0.0
+        self.data = {}
+        self.journal_sizes = {}
+        self.indexes = {}
+        self.ordered_indexes = {}
+        self.id_indexes = {}
+        self.pending_writes = {}
+        self.latencies = {}
+        self.locks = {}
+        self.guard = threading.RLock()
+
+    def _store(self, cls: type) -> dict:
+        """ Objects of cls, by id
+        """
+        s_class = cls.__name__
+        store = self.data.get(s_class)
+        if store is None:
+            store = self.data.setdefault(s_class, {})
+        return store
+
+    def lock(self, cls: type) -> threading.RLock:
+        """ Lock guarding the objects, indexes and files of cls
+        Readers only hold it to copy what they need, so that no thread
+        iterates a store another thread is changing
+        """
+        s_class = cls.__name__
+        lock = self.locks.get(s_class)
+        if lock is None:
+            with self.guard:
+                lock = self.locks.setdefault(s_class, threading.RLock())
+        return lock
+
+    def load(self, cls: type):
+        """ Load all objects of cls from file
+        The snapshot is loaded first, then the changes recorded in the
+        journal since the last compaction are replayed on top of it
+        """
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        objs = {}
+        with self.lock(cls):
+            if path.exists(file_path):
+                with open(file_path, 'r') as f:
+                    objs_json = codec.load(f)
+                    for obj_id, obj_json in objs_json.items():
+                        objs[obj_id] = cls(**obj_json)
+
+            journal_path = self._journal_path(cls)
+            self.journal_sizes[s_class] = 0
+            if path.exists(journal_path):
+                self.journal_sizes[s_class] = self._replay_journal(
+                    cls, journal_path, objs)
+            self.data[s_class] = objs
+            self._rebuild_indexes(cls)
+
+    def _replay_journal(self, cls: type, journal_path: str,
+                        objs: dict) -> int:
+        """ Apply the changes recorded in the journal to objs
+        Return the number of entries replayed
+        """
+        replayed = 0
+        with open(journal_path, 'r') as f:
+            for line in f:
+                try:
+                    entry = codec.loads(line)
+                except ValueError:
+                    # a crash can leave the last entry half written
+                    continue
+                if entry.get('op') == 'save':
+                    obj_json = entry.get('obj')
+                    objs[obj_json['id']] = cls(**obj_json)
+                elif entry.get('op') == 'remove':
+                    objs.pop(entry.get('id'), None)
+                replayed += 1
+        return replayed
+
+    def save_to_file(self, cls: type):
+        """ Save all objects of cls to file
+        With BASE_WRITE_DELAY set, the write is deferred by that many
+        seconds and every save made meanwhile is covered by the same
+        write
+        """
+        if self.write_delay <= 0:
+            self._write_snapshot(cls)
+            return
+        s_class = cls.__name__
+        with self.guard:
+            if s_class in self.pending_writes:
+                return
+            timer = threading.Timer(self.write_delay, self.flush, (cls,))
+            timer.daemon = True
+            self.pending_writes[s_class] = (cls, timer)
+            timer.start()
+
+    def flush(self, cls: type):
+        """ Write the deferred snapshot of cls, if any, right away
+        """
+        s_class = cls.__name__
+        with self.guard:
+            pending = self.pending_writes.pop(s_class, None)
+        if pending is None:
+            return
+        pending[1].cancel()
+        self._write_snapshot(cls)
+
+    def flush_all(self):
+        """ Write every deferred snapshot
+        """
+        for cls, _ in list(self.pending_writes.values()):
+            self.flush(cls)
+
+    def _write_snapshot(self, cls: type):
+        """ Atomically replace the snapshot file of cls with its objects
+        The objects are written to a temporary file which is synced to
+        disk and renamed over the snapshot, so a crash or a concurrent
+        write never leaves a truncated file behind. The snapshot
+        supersedes the journal, which is emptied
+        """
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        with self.lock(cls):
+            start = time.perf_counter()
+            objs_json = {}
+            for obj_id, obj in self._store(cls).items():
+                objs_json[obj_id] = obj.to_json(True)
+
+            dir_name = path.dirname(path.abspath(file_path))
+            fd, tmp_path = tempfile.mkstemp(prefix=file_path + '.',
+                                            dir=dir_name)
+            try:
+                # mkstemp creates the file as 0600, give it the mode the
+                # snapshot has, or would get from open()
+                os.chmod(tmp_path, _file_mode(file_path))
+                with os.fdopen(fd, 'w') as f:
+                    codec.dump(objs_json, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                if path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            journal_path = self._journal_path(cls)
+            if path.exists(journal_path):
+                os.remove(journal_path)
+            self.journal_sizes[s_class] = 0
+            self.latencies[s_class] = time.perf_counter() - start
+
+    def _journal_path(self, cls: type) -> str:
+        """ Path of the journal of changes since the last snapshot
+        """
+        return ".db_{}.journal".format(cls.__name__)
+
+    def _append_journal(self, cls: type, entry: dict):
+        """ Append one change to the journal
+        Each change costs one small append whatever the number of
+        objects; the journal is compacted into the snapshot every
+        BASE_JOURNAL_COMPACT_EVERY entries
+        """
+        s_class = cls.__name__
+        with self.lock(cls):
+            start = time.perf_counter()
+            with open(self._journal_path(cls), 'a') as f:
+                f.write(codec.dumps(entry) + '\n')
+            self.latencies[s_class] = time.perf_counter() - start
+            size = self.journal_sizes.get(s_class, 0) + 1
+            self.journal_sizes[s_class] = size
+        if size >= self.compact_every:
+            self.save_to_file(cls)
+
+    def save(self, obj: TypeVar('Base')):
+        """ Save obj
+        """
+        cls = type(obj)
+        with self.lock(cls):
+            store = self._store(cls)
+            old = store.get(obj.id)
+            store[obj.id] = obj
+            for index in self._all_indexes(cls):
+                if old is not None and old is not obj:
+                    index.discard(old)
+                index.add(obj)
+            if self.mode == 'journal':
+                self._append_journal(cls, {'op': 'save',
+                                           'obj': obj.to_json(True)})
+                return
+        self.save_to_file(cls)
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Remove obj
+        """
+        cls = type(obj)
+        with self.lock(cls):
+            old = self._store(cls).pop(obj.id, None)
+            if old is None:
+                return
+            for index in self._all_indexes(cls):
+                index.discard(old)
+            if self.mode == 'journal':
+                self._append_journal(cls, {'op': 'remove', 'id': obj.id})
+                return
+        self.save_to_file(cls)
+
+    def count(self, cls: type) -> int:
+        """ Count all objects of cls
+        """
+        return len(self._store(cls))
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return one object of cls by ID
+        """
+        return self._store(cls).get(id)
+
+    def iterate(self, cls: type) -> Iterator[TypeVar('Base')]:
+        """ Yield all objects of cls one by one, ordered by id
+        The objects are read ITERATE_SIZE at a time from the id index,
+        so memory does not grow with the number of objects; objects
+        removed meanwhile are skipped
+        """
+        after = None
+        while True:
+            objs, after = self.page(cls, ITERATE_SIZE, after)
+            for obj in objs:
+                yield obj
+            if after is None:
+                return
+
+    def page(self, cls: type, limit: int,
+             after: str = None) -> Tuple[List[TypeVar('Base')],
+                                         Optional[str]]:
+        """ Return up to limit objects of cls ordered by id, starting
+        after the id after, along with the cursor of the next page
+        """
+        with self.lock(cls):
+            store = self._store(cls)
+            ids = self._id_index(cls).after(after, limit + 1)
+            objs = [store[obj_id] for obj_id in ids[:limit]]
+        next_cursor = ids[limit - 1] if len(ids) > limit else None
+        return objs, next_cursor
+
+    def search(self, cls: type,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Search all objects of cls with matching attributes
+        When one of the attributes is indexed, only the objects of its
+        bucket are compared instead of every object of the class; the
+        ones no longer holding the value, changed in place since they
+        were indexed, are pruned from the bucket
+        """
+        def _search(obj):
+            if len(attributes) == 0:
+                return True
+            for k, v in attributes.items():
+                if (getattr(obj, k) != v):
+                    return False
+            return True
+
+        objs = None
+        indexes = self._indexes(cls)
+        with self.lock(cls):
+            store = self._store(cls)
+            for k, v in attributes.items():
+                if k not in indexes:
+                    continue
+                try:
+                    ids = indexes[k].lookup(v)
+                except TypeError:
+                    continue
+                objs = []
+                for i in ids:
+                    obj = store.get(i)
+                    if obj is not None and getattr(obj, k, None) == v:
+                        objs.append(obj)
+                    else:
+                        indexes[k].prune(v, i)
+                break
+            if objs is None:
+                objs = list(store.values())
+        return list(filter(_search, objs))
+
+    def range(self, cls: type, attr: str, lo=None,
+              hi=None) -> List[TypeVar('Base')]:
+        """ Return the objects of cls with lo <= attr < hi, ordered by
+        attr, from its ordered index
+        """
+        if attr not in cls.ordered_attributes:
+            raise ValueError("{} is not an ordered attribute of {}"
+                             .format(attr, cls.__name__))
+        with self.lock(cls):
+            index = self._ordered_index(cls, attr)
+            store = self._store(cls)
+            ids = index.range(_sort_key(lo), _sort_key(hi))
+            return [store[obj_id] for obj_id in ids if obj_id in store]
+
+    def stats(self) -> dict:
+        """ Counts, index sizes, file sizes and last write latency of
+        every class, read from counters without touching the objects
+        """
+        models = {}
+        store_bytes = 0
+        for s_class in list(self.data):
+            indexes = {}
+            for by_class in (self.indexes, self.ordered_indexes):
+                for attr, index in by_class.get(s_class, {}).items():
+                    indexes[attr] = len(index)
+            for file_path in (".db_{}.json".format(s_class),
+                              ".db_{}.journal".format(s_class)):
+                try:
+                    store_bytes += os.stat(file_path).st_size
+                except OSError:
+                    pass
+            models[s_class] = {
+                'count': len(self.data[s_class]),
+                'indexes': indexes,
+                'last_persist_seconds': self.latencies.get(s_class),
+            }
+        return {'engine': 'json', 'store_bytes': store_bytes,
+                'models': models}
+
+    def _indexes(self, cls: type) -> dict:
+        """ Hash indexes of cls, by attribute name
+        """
+        s_class = cls.__name__
+        indexes = self.indexes.get(s_class)
+        if indexes is None:
+            indexes = {attr: HashIndex(attr)
+                       for attr in cls.indexed_attributes}
+            indexes = self.indexes.setdefault(s_class, indexes)
+        return indexes
+
+    def _ordered_index(self, cls: type, attr: str) -> SortedIndex:
+        """ Ordered index of attr for cls
+        It is built from the objects by the first range query on attr,
+        so that loads and saves do not pay for an index never read, and
+        kept up to date from then on; the caller holds the lock of cls
+        """
+        indexes = self.ordered_indexes.setdefault(cls.__name__, {})
+        index = indexes.get(attr)
+        if index is None:
+            index = SortedIndex(attr, _sort_key_getter(cls, attr))
+            index.rebuild(self._store(cls).values())
+            indexes[attr] = index
+        return index
+
+    def _id_index(self, cls: type) -> SortedIndex:
+        """ Ordered index of the ids of cls, which pages are read from
+        It is built from the objects by the first page or iterate call
+        and kept up to date from then on; the caller holds the lock of
+        cls
+        """
+        s_class = cls.__name__
+        index = self.id_indexes.get(s_class)
+        if index is None:
+            index = SortedIndex('id', _id)
+            index.rebuild(self._store(cls).values())
+            self.id_indexes[s_class] = index
+        return index
+
+    def _all_indexes(self, cls: type) -> List:
+        """ Hash indexes of cls and the ordered indexes built so far
+        """
+        s_class = cls.__name__
+        indexes = (list(self._indexes(cls).values()) +
+                   list(self.ordered_indexes.get(s_class, {}).values()))
+        if s_class in self.id_indexes:
+            indexes.append(self.id_indexes[s_class])
+        return indexes
+
+    def _rebuild_indexes(self, cls: type):
+        """ Rebuild the indexes of cls from its objects
+        The ordered indexes and the id index are dropped, the next
+        query needing them builds them again
+        """
+        with self.lock(cls):
+            self.ordered_indexes.pop(cls.__name__, None)
+            self.id_indexes.pop(cls.__name__, None)
+            for index in self._all_indexes(cls):
+                index.rebuild(self._store(cls).values())
+
+
+def _id(obj: TypeVar('Base')) -> str:
+    """ Sort key of the id index
+    """
+    return obj.id
+
+
+def _file_mode(file_path: str) -> int:
+    """ Permission bits of file_path, or those open() gives a new file
+    under the process umask when it does not exist
+    """
+    try:
+        return os.stat(file_path).st_mode & 0o7777
+    except OSError:
+        return 0o666 & ~UMASK
+
+
+def _sort_key_getter(cls: type, attr: str):
+    """ Function returning the sort key of attr for an object of cls
+    Timestamps are keyed by their TIMESTAMP_FORMAT string, which sorts
+    chronologically and is read without parsing a lazy date
+    """
+    descriptor = getattr(cls, attr, None)
+    if isinstance(descriptor, Timestamp):
+        def key(obj):
+            return _sort_key(getattr(obj, descriptor.slot, None))
+    else:
+        def key(obj):
+            return _sort_key(getattr(obj, attr, None))
+    return key
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+""" SQLiteStorage module
+Storage engine keeping one table per class in a SQLite database
+"""
+from contextlib import contextmanager
+from os import getenv
+from typing import TypeVar, List, Iterator, Optional, Tuple
+import os
+import sqlite3
+import threading
+import time
+
+from models.base import _fields, _sort_key
+
+
+FETCH_SIZE = 500
+POOL_SIZE = 8
+
+
+class SQLiteStorage():
+    """ Store every class in its own table of a SQLite database
+
+    Each attribute serialized by to_json is a column and the id is the
+    primary key; indexed_attributes and ordered_attributes get a SQL
+    index. The database runs in WAL mode, so readers never wait for a
+    writer, and every statement is a parameterized string built once per
+    class, which sqlite3 keeps compiled in its statement cache.
+    Connections are borrowed from a pool keeping up to
+    BASE_SQLITE_POOL_SIZE idle ones, so that a request served on a new
+    thread does not open its own.
+    Only the rows a query asks for are read, objects are not kept in
+    memory. The number of rows of each table is kept in the _counts
+    table by triggers, so counting never scans a table
+    """
+
+    def __init__(self, file_path: str = '.db.sqlite3'):
+        """ Initialize a storage on the database at file_path
+        """
+        self.file_path = file_path
+        try:
+            pool_size = int(getenv('BASE_SQLITE_POOL_SIZE', POOL_SIZE))
+        except ValueError:
+            pool_size = POOL_SIZE
+        self.pool_size = max(pool_size, 1)
+        self.idle = []
+        self.idle_lock = threading.Lock()
+        self.tables = {}
+        self.latencies = {}
+        self.guard = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """ Open a connection to the database
+        """
+        conn = sqlite3.connect(self.file_path, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """ Borrow a connection for the duration of a with block
+        An idle connection is reused when there is one, else a new one
+        is opened, so a busy pool never blocks; on return it is kept if
+        the pool has room and closed otherwise. A connection is only
+        used by one thread at a time
+        """
+        with self.idle_lock:
+            conn = self.idle.pop() if self.idle else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with self.idle_lock:
+                if len(self.idle) < self.pool_size:
+                    self.idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def _table(self, cls: type) -> dict:
+        """ Columns and statements of the table of cls, creating the
+        table, its missing columns and its indexes on first use
+        """
+        s_class = cls.__name__
+        table = self.tables.get(s_class)
+        if table is not None:
+            return table
+        with self.guard:
+            table = self.tables.get(s_class)
+            if table is None:
+                table = self._create_table(cls)
+                self.tables[s_class] = table
+        return table
+
+    def _create_table(self, cls: type) -> dict:
+        """ Create the table of cls and return its columns and statements
+        The schema is updated in one transaction, so that concurrent
+        processes agree on the row count the triggers start from
+        """
+        s_class = cls.__name__
+        name = _quote(s_class)
+        columns = [key for key, _ in _fields(cls)]
+        with self._connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._create_schema(conn, cls, columns)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+        quoted = [_quote(c) for c in columns]
+        select = 'SELECT {} FROM {}'.format(', '.join(quoted), name)
+        return {
+            'columns': frozenset(columns),
+            'keys': columns,
+            'indexes': [attr for attr in dict.fromkeys(
+                cls.indexed_attributes + cls.ordered_attributes)
+                if attr in columns and attr != 'id'],
+            'select': select,
+            'insert': 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ("id") '
+                      'DO UPDATE SET {}'.format(
+                          name, ', '.join(quoted),
+                          ', '.join('?' * len(columns)),
+                          ', '.join('{0} = excluded.{0}'.format(c)
+                                    for c in quoted if c != '"id"')),
+            'delete': 'DELETE FROM {} WHERE "id" = ?'.format(name),
+            'get': select + ' WHERE "id" = ?',
+            'all': select + ' ORDER BY rowid',
+            'first_page': select + ' ORDER BY "id" LIMIT ?',
+            'next_page': select + ' WHERE "id" > ? ORDER BY "id" LIMIT ?',
+        }
+
+    def _create_schema(self, conn: sqlite3.Connection, cls: type,
+                       columns: List[str]):
+        """ Create the table of cls, its missing columns, its indexes and
+        the triggers counting its rows
+        """
+        s_class = cls.__name__
+        name = _quote(s_class)
+        conn.execute('CREATE TABLE IF NOT EXISTS {} ({})'.format(
+            name, ', '.join('{} TEXT PRIMARY KEY'.format(_quote(c))
+                            if c == 'id' else _quote(c) for c in columns)))
+        existing = {row['name'] for row in
+                    conn.execute('PRAGMA table_info({})'.format(name))}
+        for column in columns:
+            if column not in existing:
+                conn.execute('ALTER TABLE {} ADD COLUMN {}'.format(
+                    name, _quote(column)))
+        for attr in cls.indexed_attributes + cls.ordered_attributes:
+            if attr in columns and attr != 'id':
+                conn.execute('CREATE INDEX IF NOT EXISTS {} ON {} ({})'
+                             .format(_quote('{}_{}'.format(s_class, attr)),
+                                     name, _quote(attr)))
+
+        conn.execute('CREATE TABLE IF NOT EXISTS "_counts" '
+                     '("name" TEXT PRIMARY KEY, "count" INTEGER NOT NULL)')
+        conn.execute('INSERT OR IGNORE INTO "_counts" VALUES '
+                     '(?, (SELECT COUNT(*) FROM {}))'.format(name),
+                     (s_class,))
+        # saves are upserts, which fire the insert trigger only for new
+        # rows
+        for event, delta in (('INSERT', '+ 1'), ('DELETE', '- 1')):
+            conn.execute(
+                'CREATE TRIGGER IF NOT EXISTS {} AFTER {} ON {} BEGIN '
+                'UPDATE "_counts" SET "count" = "count" {} '
+                'WHERE "name" = {}; END'.format(
+                    _quote('{}_{}'.format(s_class, event.lower())),
+                    event, name, delta, _literal(s_class)))
+
+    def load(self, cls: type):
+        """ Make sure the table of cls exists, rows are read on demand
+        """
+        self._table(cls)
+
+    def save_to_file(self, cls: type):
+        """ Nothing to do, every change is committed as it is made
+        """
+        self._table(cls)
+
+    def flush(self, cls: type):
+        """ Nothing to do, no write is ever deferred
+        """
+
+    def flush_all(self):
+        """ Nothing to do, no write is ever deferred
+        """
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or replace the row of obj
+        """
+        table = self._table(type(obj))
+        obj_json = obj.to_json(True)
+        start = time.perf_counter()
+        with self._connection() as conn:
+            conn.execute(table['insert'],
+                         [obj_json.get(key) for key in table['keys']])
+        self.latencies[type(obj).__name__] = time.perf_counter() - start
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete the row of obj
+        """
+        table = self._table(type(obj))
+        start = time.perf_counter()
+        with self._connection() as conn:
+            conn.execute(table['delete'], (obj.id,))
+        self.latencies[type(obj).__name__] = time.perf_counter() - start
+
+    def count(self, cls: type) -> int:
+        """ Count all rows of cls, from the counter of its table
+        """
+        self._table(cls)
+        with self._connection() as conn:
+            row = conn.execute(
+                'SELECT "count" FROM "_counts" WHERE "name" = ?',
+                (cls.__name__,)).fetchone()
+        return 0 if row is None else row[0]
+
+    def stats(self) -> dict:
+        """ Counts, index sizes, file size and last write latency of
+        every table, read from the counters without touching the rows
+        Every row has an entry in each index of its table, NULL values
+        included, so an index has as many entries as the table has rows
+        """
+        counts = {}
+        if self.tables:
+            with self._connection() as conn:
+                counts = dict(conn.execute(
+                    'SELECT "name", "count" FROM "_counts"').fetchall())
+        models = {}
+        for s_class, table in list(self.tables.items()):
+            count = counts.get(s_class, 0)
+            models[s_class] = {
+                'count': count,
+                'indexes': {attr: count for attr in table['indexes']},
+                'last_persist_seconds': self.latencies.get(s_class),
+            }
+        store_bytes = 0
+        for suffix in ('', '-wal'):
+            try:
+                store_bytes += os.stat(self.file_path + suffix).st_size
+            except OSError:
+                pass
+        return {'engine': 'sqlite', 'store_bytes': store_bytes,
+                'models': models}
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return one object of cls by ID
+        """
+        table = self._table(cls)
+        with self._connection() as conn:
+            row = conn.execute(table['get'], (id,)).fetchone()
+        return None if row is None else cls(**dict(row))
+
+    def iterate(self, cls: type) -> Iterator[TypeVar('Base')]:
+        """ Yield all objects of cls one by one, in insertion order
+        Rows are fetched FETCH_SIZE at a time
+        """
+        table = self._table(cls)
+        with self._connection() as conn:
+            cursor = conn.execute(table['all'])
+            try:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                while rows:
+                    for row in rows:
+                        yield cls(**dict(row))
+                    rows = cursor.fetchmany(FETCH_SIZE)
+            finally:
+                cursor.close()
+
+    def page(self, cls: type, limit: int,
+             after: str = None) -> Tuple[List[TypeVar('Base')],
+                                         Optional[str]]:
+        """ Return up to limit objects of cls ordered by id, starting
+        after the id after, along with the cursor of the next page
+        """
+        table = self._table(cls)
+        with self._connection() as conn:
+            if after is None:
+                rows = conn.execute(table['first_page'],
+                                    (limit + 1,)).fetchall()
+            else:
+                rows = conn.execute(table['next_page'],
+                                    (after, limit + 1)).fetchall()
+        objs = [cls(**dict(row)) for row in rows[:limit]]
+        next_cursor = objs[-1].id if len(rows) > limit else None
+        return objs, next_cursor
+
+    def search(self, cls: type,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Search all objects of cls with matching attributes
+        Attributes stored in a column are matched by SQLite, through its
+        index when there is one; the others are compared on the objects
+        """
+        table = self._table(cls)
+        clauses = []
+        params = []
+        others = {}
+        for k, v in attributes.items():
+            value = _sort_key(v)
+            if k in table['columns'] and _is_scalar(value):
+                clauses.append('{} IS ?'.format(_quote(k)))
+                params.append(value)
+            else:
+                others[k] = v
+        sql = table['select']
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        with self._connection() as conn:
+            objs = [cls(**dict(row)) for row in
+                    conn.execute(sql + ' ORDER BY rowid', params)]
+        if others:
+            objs = [obj for obj in objs
+                    if all(getattr(obj, k) == v for k, v in others.items())]
+        return objs
+
+    def range(self, cls: type, attr: str, lo=None,
+              hi=None) -> List[TypeVar('Base')]:
+        """ Return the objects of cls with lo <= attr < hi, ordered by
+        attr, from its SQL index
+        """
+        table = self._table(cls)
+        if attr not in cls.ordered_attributes or \
+                attr not in table['columns']:
+            raise ValueError("{} is not an ordered attribute of {}"
+                             .format(attr, cls.__name__))
+        clauses = ['{} IS NOT NULL'.format(_quote(attr))]
+        params = []
+        if lo is not None:
+            clauses.append('{} >= ?'.format(_quote(attr)))
+            params.append(_sort_key(lo))
+        if hi is not None:
+            clauses.append('{} < ?'.format(_quote(attr)))
+            params.append(_sort_key(hi))
+        sql = '{} WHERE {} ORDER BY {}, "id"'.format(
+            table['select'], ' AND '.join(clauses), _quote(attr))
+        with self._connection() as conn:
+            return [cls(**dict(row)) for row in conn.execute(sql, params)]
+
+
+def _quote(name: str) -> str:
+    """ Quote a table or column name for SQL
+    """
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def _literal(value: str) -> str:
+    """ Quote a string literal for SQL, where parameters are not allowed
+    """
+    return "'{}'".format(value.replace("'", "''"))
+
+
+def _is_scalar(value) -> bool:
+    """ Whether value can be bound to a SQL parameter
+    """
+    return value is None or type(value) in (str, int, float, bytes)
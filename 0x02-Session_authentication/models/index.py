@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+""" Index module
+"""
+from typing import Any, Callable, Iterable, List, TypeVar
+import bisect
+
+
+SETTLE_BY_BISECT = 512
+
+
+class HashIndex():
+    """ Equality index mapping the value of one attribute to the ids
+    of the objects holding it
+
+    Indexed attributes are mostly unique, so a value maps to the bare id
+    of its object, and to a set of ids only once several objects share
+    it. The value of each object is not remembered: an object changed in
+    place stays under its old value as well until prune drops it, which
+    is why lookup only returns candidates
+    """
+
+    def __init__(self, attr: str):
+        """ Initialize an empty index on attr
+        """
+        self.attr = attr
+        self.buckets = {}
+        self.size = 0
+        self.unhashable = {}
+
+    def __len__(self) -> int:
+        """ Number of indexed objects, counting the stale entries of
+        objects changed in place until they are pruned
+        """
+        return self.size + len(self.unhashable)
+
+    def add(self, obj: TypeVar('Base')):
+        """ Index obj under the current value of its attribute
+        """
+        obj_id = obj.id
+        value = getattr(obj, self.attr, None)
+        try:
+            bucket = self.buckets.get(value)
+        except TypeError:
+            self.unhashable[obj_id] = None
+            return
+        self.unhashable.pop(obj_id, None)
+        if bucket is None:
+            self.buckets[value] = obj_id
+        elif isinstance(bucket, set):
+            if obj_id in bucket:
+                return
+            bucket.add(obj_id)
+        elif bucket == obj_id:
+            return
+        else:
+            self.buckets[value] = {bucket, obj_id}
+        self.size += 1
+
+    def discard(self, obj: TypeVar('Base')):
+        """ Remove obj, indexed under the current value of its attribute
+        """
+        self.unhashable.pop(obj.id, None)
+        try:
+            self.prune(getattr(obj, self.attr, None), obj.id)
+        except TypeError:
+            pass
+
+    def prune(self, value, obj_id: str):
+        """ Remove the id obj_id from the bucket of value, if it is there
+        """
+        bucket = self.buckets.get(value)
+        if bucket is None:
+            return
+        if isinstance(bucket, set):
+            if obj_id not in bucket:
+                return
+            bucket.discard(obj_id)
+            if len(bucket) == 1:
+                self.buckets[value] = next(iter(bucket))
+        elif bucket == obj_id:
+            del self.buckets[value]
+        else:
+            return
+        self.size -= 1
+
+    def clear(self):
+        """ Remove every object from the index
+        """
+        self.buckets.clear()
+        self.size = 0
+        self.unhashable.clear()
+
+    def rebuild(self, objs: Iterable[TypeVar('Base')]):
+        """ Replace the content of the index with objs
+        """
+        self.clear()
+        for obj in objs:
+            self.add(obj)
+
+    def lookup(self, value) -> Iterable[str]:
+        """ Ids of the objects whose attribute may equal value
+        Objects with an unhashable value are always returned, the caller
+        is expected to compare the attribute itself
+        """
+        bucket = self.buckets.get(value)
+        if bucket is None:
+            ids = []
+        elif isinstance(bucket, set):
+            ids = list(bucket)
+        else:
+            ids = [bucket]
+        if self.unhashable:
+            ids.extend(self.unhashable)
+        return ids
+
+
+class SortedIndex():
+    """ Ordered index of one attribute, kept as a list of (key, id) pairs
+    sorted with bisect
+
+    add and discard only record the change, which the next read applies
+    to the list: one by one with bisect when there are up to
+    SETTLE_BY_BISECT of them, else by sorting the list again, which
+    takes linear time on a list that is mostly sorted already. Writes
+    therefore cost the same whatever the size of the index
+    """
+
+    def __init__(self, attr: str, key: Callable[[TypeVar('Base')], Any]):
+        """ Initialize an empty index on attr
+        key returns the sort key of an object, None leaves it out
+        """
+        self.attr = attr
+        self.key = key
+        self.entries = []
+        self.keys = {}
+        self.pending = {}
+        self.size = 0
+
+    def __len__(self) -> int:
+        """ Number of indexed objects
+        """
+        return self.size
+
+    def add(self, obj: TypeVar('Base')):
+        """ Index obj, or move it to the position of its new key
+        """
+        self._change(obj.id, self.key(obj))
+
+    def discard(self, obj: TypeVar('Base')):
+        """ Remove obj from the index
+        """
+        self._change(obj.id, None)
+
+    def _change(self, obj_id: str, key):
+        """ Record that obj_id now has the key key, None to remove it
+        """
+        pending = self.pending
+        current = pending[obj_id] if obj_id in pending else \
+            self.keys.get(obj_id)
+        if current == key:
+            return
+        self.size += (key is not None) - (current is not None)
+        if self.keys.get(obj_id) == key:
+            del pending[obj_id]
+        else:
+            pending[obj_id] = key
+
+    def _settle(self):
+        """ Apply the recorded changes to the sorted list
+        """
+        pending = self.pending
+        if not pending:
+            return
+        entries = self.entries
+        keys = self.keys
+        if len(pending) <= SETTLE_BY_BISECT:
+            for obj_id, key in pending.items():
+                old = keys.pop(obj_id, None)
+                if old is not None:
+                    i = bisect.bisect_left(entries, (old, obj_id))
+                    del entries[i]
+                if key is not None:
+                    bisect.insort(entries, (key, obj_id))
+                    keys[obj_id] = key
+        else:
+            if any(obj_id in keys for obj_id in pending):
+                entries = [entry for entry in entries
+                           if entry[1] not in pending]
+                for obj_id in pending:
+                    keys.pop(obj_id, None)
+            for obj_id, key in pending.items():
+                if key is not None:
+                    entries.append((key, obj_id))
+                    keys[obj_id] = key
+            entries.sort()
+            self.entries = entries
+        self.pending = {}
+
+    def clear(self):
+        """ Remove every object from the index
+        """
+        self.entries = []
+        self.keys.clear()
+        self.pending = {}
+        self.size = 0
+
+    def rebuild(self, objs: Iterable[TypeVar('Base')]):
+        """ Replace the content of the index with objs, sorting them once
+        instead of inserting them one by one
+        """
+        keys = {}
+        for obj in objs:
+            key = self.key(obj)
+            if key is not None:
+                keys[obj.id] = key
+        self.keys = keys
+        self.entries = sorted((key, obj_id) for obj_id, key in keys.items())
+        self.pending = {}
+        self.size = len(keys)
+
+    def after(self, key=None, limit: int = None) -> List[str]:
+        """ Ids of at most limit objects with a key greater than key, in
+        key order, the first ones when key is None
+        """
+        self._settle()
+        entries = self.entries
+        start = 0
+        if key is not None:
+            start = bisect.bisect_left(entries, (key,))
+            while start < len(entries) and entries[start][0] == key:
+                start += 1
+        end = len(entries) if limit is None else start + limit
+        return [obj_id for _, obj_id in entries[start:end]]
+
+    def range(self, lo=None, hi=None) -> List[str]:
+        """ Ids of the objects with lo <= key < hi, in key order
+        A bound left to None is open
+        """
+        self._settle()
+        start = 0 if lo is None else bisect.bisect_left(self.entries, (lo,))
+        if hi is None:
+            end = len(self.entries)
+        else:
+            end = bisect.bisect_left(self.entries, (hi,))
+        return [obj_id for _, obj_id in self.entries[start:end]]
@@ -3,6 +3,7 @@
 """
 
 import bcrypt
+import os
 from db import DB
 from user import User
 from uuid import uuid4
@@ -11,6 +12,39 @@ from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.orm.exc import NoResultFound
 
 
+BCRYPT_ROUNDS = 12
+
+
+def _bcrypt_rounds() -> int:
+    """Returns the bcrypt cost factor set by AUTH_BCRYPT_ROUNDS
+
+    Returns:
+        int: the cost factor, kept within the 4 to 31 range of bcrypt
+    """
+    try:
+        rounds = int(os.getenv("AUTH_BCRYPT_ROUNDS"))
+    except (TypeError, ValueError):
+        return BCRYPT_ROUNDS
+    return min(max(rounds, 4), 31)
+
+
+def _needs_rehash(hashed_password: bytes) -> bool:
+    """Checks whether a hash was made with another cost than the
+    configured one
+
+    Args:
+        hashed_password (bytes): bcrypt hash of a password
+
+    Returns:
+        bool: True if the hash should be recomputed
+    """
+    try:
+        cost = int(hashed_password.split(b"$")[2])
+    except (IndexError, ValueError):
+        return False
+    return cost != _bcrypt_rounds()
+
+
 def _hash_password(password: str) -> bytes:
     """Hash the input password using bcrypt with a salt
 
@@ -20,7 +54,7 @@ def _hash_password(password: str) -> bytes:
     Returns:
         bytes: Salted hash of the input password
     """
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(_bcrypt_rounds())
     hashed_pwd = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed_pwd
 
@@ -79,7 +113,14 @@ class Auth():
         except NoResultFound:
             return False
         # validate user password
-        return bcrypt.checkpw(password.encode('utf-8'), user.hashed_password)
+        hashed_pwd = user.hashed_password
+        if not bcrypt.checkpw(password.encode('utf-8'), hashed_pwd):
+            return False
+        # upgrade hashes made with an outdated cost factor
+        if _needs_rehash(hashed_pwd):
+            self._db.update_user(user.id,
+                                 hashed_password=_hash_password(password))
+        return True
 
     def create_session(self, email: str) -> str:
         """finds the user corresponding to the email, generate a new